@@ -0,0 +1,160 @@
+import time
+from .config import (
+    MAX_SESSIONS,
+    MAX_USERS_PER_SESSION,
+    MAX_UPSTREAM_SOCKETS,
+    CLIENT_MSGS_PER_SECOND,
+    CLIENT_BYTES_PER_SECOND,
+    ROOM_MSGS_PER_SECOND,
+    ROOM_BYTES_PER_SECOND,
+    RATE_LIMIT_BURST_SECONDS,
+    RATE_LIMIT_CLOSE_AFTER_SECONDS,
+)
+
+# Close codes sent to rejected clients
+CLOSE_TRY_AGAIN_LATER = 1013  # Capacity caps: server, room or upstream full
+CLOSE_POLICY_VIOLATION = 1008  # Client kept exceeding its rate limit
+
+# How often a throttled client is reminded
+THROTTLE_NOTICE_INTERVAL = 1.0
+
+# Set while the process drains for shutdown; new joins are turned away
+draining = False
+
+# Process-wide counters reported by /metrics
+stats = {
+    "rejected_draining": 0,
+    "rejected_sessions": 0,
+    "rejected_users": 0,
+    "rejected_upstream": 0,
+    "throttled_frames": 0,
+    "rate_limit_closes": 0,
+}
+
+
+def limits():
+    return {
+        "max_sessions": MAX_SESSIONS,
+        "max_users_per_session": MAX_USERS_PER_SESSION,
+        "max_upstream_sockets": MAX_UPSTREAM_SOCKETS,
+        "client_msgs_per_second": CLIENT_MSGS_PER_SECOND,
+        "client_bytes_per_second": CLIENT_BYTES_PER_SECOND,
+        "room_msgs_per_second": ROOM_MSGS_PER_SECOND,
+        "room_bytes_per_second": ROOM_BYTES_PER_SECOND,
+        "burst_seconds": RATE_LIMIT_BURST_SECONDS,
+    }
+
+
+def upstream_sockets_in_use(sessions):
+    return sum(1 for s in sessions.values() if s.gemini_ws is not None)
+
+
+def check_join(sessions, session_id):
+    """Returns a close reason if a new client may not join session_id, else None."""
+    if draining:
+        stats["rejected_draining"] += 1
+        return "Server is restarting"
+    session = sessions.get(session_id)
+    if session is None and len(sessions) >= MAX_SESSIONS:
+        stats["rejected_sessions"] += 1
+        return "Server is at session capacity"
+    if session is not None and len(session.users) >= MAX_USERS_PER_SESSION:
+        stats["rejected_users"] += 1
+        return "Room is full"
+    return None
+
+
+def check_upstream(sessions):
+    """Returns a reason if another upstream socket may not be opened, else None."""
+    if upstream_sockets_in_use(sessions) >= MAX_UPSTREAM_SOCKETS:
+        stats["rejected_upstream"] += 1
+        return "Upstream connection limit reached"
+    return None
+
+
+class TokenBucket:
+    """Classic token bucket: refills at `rate` per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, amount, now):
+        self._refill(now)
+        return self.tokens >= amount
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def retry_after(self, amount):
+        """Seconds until `amount` tokens will be available."""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class RoomRateLimiter:
+    """Message and byte budgets shared by everyone in a room."""
+
+    def __init__(self):
+        self.messages = TokenBucket(ROOM_MSGS_PER_SECOND, ROOM_MSGS_PER_SECOND * RATE_LIMIT_BURST_SECONDS)
+        self.bytes = TokenBucket(ROOM_BYTES_PER_SECOND, ROOM_BYTES_PER_SECOND * RATE_LIMIT_BURST_SECONDS)
+        self.throttled_frames = 0
+
+
+class ClientRateLimiter:
+    """
+    Per-client message and byte budgets, checked together with the room's.
+    A frame passes only if all four buckets can pay for it.
+    """
+
+    def __init__(self, room):
+        self.room = room
+        self.messages = TokenBucket(CLIENT_MSGS_PER_SECOND, CLIENT_MSGS_PER_SECOND * RATE_LIMIT_BURST_SECONDS)
+        self.bytes = TokenBucket(CLIENT_BYTES_PER_SECOND, CLIENT_BYTES_PER_SECOND * RATE_LIMIT_BURST_SECONDS)
+        self.throttled_since = None
+        self.last_notice = 0.0
+
+    def check(self, nbytes):
+        """
+        Charges a frame of nbytes. Returns None if it may pass, otherwise
+        (scope, retry_after_seconds) where scope is "client" or "room".
+        """
+        now = time.monotonic()
+        for scope, messages, size in (("client", self.messages, self.bytes), ("room", self.room.messages, self.room.bytes)):
+            if not messages.available(1, now):
+                return self._throttled(now, scope, messages.retry_after(1))
+            if not size.available(nbytes, now):
+                return self._throttled(now, scope, size.retry_after(nbytes))
+
+        for bucket in (self.messages, self.room.messages):
+            bucket.take(1)
+        for bucket in (self.bytes, self.room.bytes):
+            bucket.take(nbytes)
+        self.throttled_since = None
+        return None
+
+    def _throttled(self, now, scope, retry_after):
+        # Only the client's own excess counts towards disconnecting it
+        if scope == "client" and self.throttled_since is None:
+            self.throttled_since = now
+        self.room.throttled_frames += 1
+        stats["throttled_frames"] += 1
+        return scope, retry_after
+
+    def should_close(self):
+        """True once the client has been over its own limit for too long."""
+        if self.throttled_since is None:
+            return False
+        return time.monotonic() - self.throttled_since >= RATE_LIMIT_CLOSE_AFTER_SECONDS
+
+    def should_notify(self):
+        now = time.monotonic()
+        if now - self.last_notice < THROTTLE_NOTICE_INTERVAL:
+            return False
+        self.last_notice = now
+        return True
@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import json
+import numpy as np
+from .media_governor import media_chunks, chunk_mime_type
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+# One upstream message carries this many mixed frames (100 ms)
+FRAMES_PER_PACKET = 5
+PACKET_SECONDS = FRAME_MS * FRAMES_PER_PACKET / 1000
+# A participant only starts contributing once this much audio is buffered
+JITTER_FRAMES = 3
+# Older audio is discarded beyond this, bounding the latency a slow client adds
+MAX_BUFFER_FRAMES = 25
+
+
+def audio_payload(data):
+    """Returns (mime_type, base64 data) if the frame is a pure PCM audio chunk, else None."""
+    chunks = media_chunks(data)
+    if len(chunks) != 1:
+        return None
+    mime_type = chunk_mime_type(chunks[0])
+    if not mime_type.startswith("audio/pcm"):
+        return None
+    return mime_type, chunks[0].get("data")
+
+
+class JitterBuffer:
+    """Per-participant queue of 16-bit samples, read in fixed-size frames."""
+
+    def __init__(self):
+        self.samples = np.zeros(0, dtype=np.int16)
+        self.primed = False
+
+    def push(self, pcm):
+        self.samples = np.concatenate((self.samples, pcm))
+        overflow = len(self.samples) - MAX_BUFFER_FRAMES * FRAME_SAMPLES
+        if overflow > 0:
+            self.samples = self.samples[overflow:]
+        if len(self.samples) >= JITTER_FRAMES * FRAME_SAMPLES:
+            self.primed = True
+
+    def pop(self, count):
+        """Returns up to `count` samples zero-padded to length, or None while not primed."""
+        if not self.primed:
+            return None
+        out = self.samples[:count]
+        self.samples = self.samples[count:]
+        if len(out) < count:
+            # Underrun: play what we have, then wait to re-prime
+            self.primed = False
+            out = np.pad(out, (0, count - len(out)))
+        return out
+
+
+class AudioMixer:
+    """
+    Mixes every participant's 16 kHz PCM microphone chunks into a single
+    stream and sends it upstream in paced 100 ms packets, instead of relaying
+    each participant's fragments interleaved over the shared socket.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.buffers = {}  # client_id -> JitterBuffer
+        self.mime_type = "audio/pcm"
+        self.task = None
+        self.packets_sent = 0
+        self.chunks_mixed = 0
+
+    def accept(self, client_id, data):
+        """Takes ownership of an audio frame. Returns False for anything else."""
+        payload = audio_payload(data)
+        if not payload:
+            return False
+        mime_type, encoded = payload
+        try:
+            pcm = np.frombuffer(base64.b64decode(encoded), dtype="<i2")
+        except Exception:
+            return False
+
+        self.mime_type = mime_type
+        self.buffers.setdefault(client_id, JitterBuffer()).push(pcm)
+        self.chunks_mixed += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return True
+
+    def forget(self, client_id):
+        self.buffers.pop(client_id, None)
+
+    def mix_packet(self):
+        """Mixes one packet from all primed participants. Returns int16 samples, or None if silent."""
+        count = FRAME_SAMPLES * FRAMES_PER_PACKET
+        tracks = [t for t in (b.pop(count) for b in self.buffers.values()) if t is not None]
+        if not tracks:
+            return None
+        if len(tracks) == 1:
+            return tracks[0]
+        mixed = np.sum(np.stack(tracks).astype(np.int32), axis=0)
+        return np.clip(mixed, -32768, 32767).astype(np.int16)
+
+    def encode_packet(self, pcm):
+        chunk = {"mime_type": self.mime_type, "data": base64.b64encode(pcm.astype("<i2").tobytes()).decode("ascii")}
+        return json.dumps({"realtime_input": {"media_chunks": [chunk]}})
+
+    async def _run(self):
+        """Paces packets on the loop clock so sends don't drift or burst."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        try:
+            while True:
+                next_tick += PACKET_SECONDS
+                pcm = self.mix_packet()
+                gemini_ws = self.session.gemini_ws
+                if pcm is not None and gemini_ws:
+                    await gemini_ws.send(self.encode_packet(pcm))
+                    self.session.touch()
+                    self.packets_sent += 1
+
+                delay = next_tick - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # Fell behind (e.g. slow send); resync instead of bursting
+                    next_tick = loop.time()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Audio mixer stopped for session {self.session.session_id}: {e}")
+        finally:
+            self.task = None
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def stats(self):
+        return {
+            "participants": len(self.buffers),
+            "chunks_mixed": self.chunks_mixed,
+            "packets_sent": self.packets_sent,
+        }
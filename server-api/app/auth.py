@@ -1,14 +1,22 @@
+import threading
 
-import google.auth
-from google.auth.transport.requests import Request
+_credentials = None
+_credentials_lock = threading.Lock()
 
 def generate_access_token():
     """Retrieves an access token using Google Cloud default credentials."""
+    global _credentials
     try:
-        creds, _ = google.auth.default()
-        if not creds.valid:
-            creds.refresh(Request())
-        return creds.token
+        # google.auth is imported lazily to keep it off the startup path
+        import google.auth
+        from google.auth.transport.requests import Request
+
+        with _credentials_lock:
+            if _credentials is None:
+                _credentials, _ = google.auth.default()
+            if not _credentials.valid:
+                _credentials.refresh(Request())
+            return _credentials.token
     except Exception as e:
         print(f"Error generating access token: {e}")
         print("Make sure you're logged in with: gcloud auth application-default login")
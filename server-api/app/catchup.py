@@ -0,0 +1,128 @@
+import base64
+import time
+from collections import deque
+from .config import CATCHUP_AUDIO_SECONDS, CATCHUP_TRANSCRIPT_ENTRIES, CATCHUP_ENTRY_MAX_CHARS
+
+# Gemini Live returns 24 kHz 16-bit mono PCM
+OUTPUT_AUDIO_BYTES_PER_SECOND = 24000 * 2
+
+
+class AudioRing:
+    """Fixed-size circular byte buffer holding the most recent audio."""
+
+    def __init__(self, capacity):
+        self.buf = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+
+    def write(self, data):
+        capacity = len(self.buf)
+        if len(data) >= capacity:
+            self.buf[:] = data[-capacity:]
+            self.start = 0
+            self.size = capacity
+            return
+
+        end = (self.start + self.size) % capacity
+        first = min(len(data), capacity - end)
+        self.buf[end:end + first] = data[:first]
+        self.buf[:len(data) - first] = data[first:]
+
+        self.size += len(data)
+        if self.size > capacity:
+            self.start = (self.start + self.size - capacity) % capacity
+            self.size = capacity
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    def read(self):
+        end = self.start + self.size
+        if end <= len(self.buf):
+            return bytes(self.buf[self.start:end])
+        return bytes(self.buf[self.start:]) + bytes(self.buf[:end - len(self.buf)])
+
+
+class CatchupBuffer:
+    """
+    Bounded record of a session's recent Gemini output (transcripts and the
+    last CATCHUP_AUDIO_SECONDS of audio) replayed to participants who join
+    mid-session. Memory is capped by the entry count, entry length and audio
+    ring size, however long the session runs.
+    """
+
+    def __init__(self):
+        self.transcript = deque(maxlen=CATCHUP_TRANSCRIPT_ENTRIES)
+        self.audio = None  # Allocated on first audio so text rooms don't pay for it
+        self.audio_mime_type = None
+        self.audio_written_at = None  # time.monotonic() of the last audio write
+
+    def _audio_is_fresh(self):
+        # Audio from a turn that ended a while ago would play as if Gemini were speaking now
+        return self.audio_written_at is not None and time.monotonic() - self.audio_written_at <= CATCHUP_AUDIO_SECONDS
+
+    def _add_text(self, role, text, finished=False):
+        if not text:
+            return
+        last = self.transcript[-1] if self.transcript else None
+        # Streamed transcription arrives in fragments; fold them into one entry
+        if last and last["role"] == role and not last["finished"]:
+            last["text"] = (last["text"] + text)[-CATCHUP_ENTRY_MAX_CHARS:]
+            last["finished"] = finished
+        else:
+            self.transcript.append({"role": role, "text": text[-CATCHUP_ENTRY_MAX_CHARS:], "finished": finished})
+
+    def record(self, data):
+        """Records a parsed Gemini frame."""
+        server_content = data.get("serverContent")
+        if not isinstance(server_content, dict):
+            return
+
+        for key, role in (("inputTranscription", "user"), ("outputTranscription", "model")):
+            transcription = server_content.get(key)
+            if isinstance(transcription, dict):
+                self._add_text(role, transcription.get("text"), bool(transcription.get("finished")))
+
+        parts = (server_content.get("modelTurn") or {}).get("parts") or []
+        for part in parts:
+            if part.get("text"):
+                self._add_text("model", part["text"])
+            inline_data = part.get("inlineData") or {}
+            is_audio = inline_data.get("mimeType", "").startswith("audio/")
+            if inline_data.get("data") and is_audio and CATCHUP_AUDIO_SECONDS > 0:
+                if self.audio is None:
+                    self.audio = AudioRing(int(CATCHUP_AUDIO_SECONDS * OUTPUT_AUDIO_BYTES_PER_SECOND) // 2 * 2)
+                elif not self._audio_is_fresh():
+                    # Don't splice a new turn onto stale audio
+                    self.audio.clear()
+                self.audio_mime_type = inline_data["mimeType"]
+                self.audio.write(base64.b64decode(inline_data["data"]))
+                self.audio_written_at = time.monotonic()
+
+        if server_content.get("turnComplete") and self.transcript:
+            self.transcript[-1]["finished"] = True
+
+    def record_client_text(self, text):
+        """Records a participant's typed turn."""
+        self._add_text("user", text, finished=True)
+
+    def history_turns(self):
+        """The transcript as client_content turns, for re-seeding a fresh upstream."""
+        return [
+            {"role": entry["role"], "parts": [{"text": entry["text"]}]}
+            for entry in self.transcript
+        ]
+
+    def snapshot(self):
+        """Returns the compacted catch-up message, or None if there is nothing to send."""
+        audio = self.audio.read() if self.audio and self._audio_is_fresh() else b""
+        if not self.transcript and not audio:
+            return None
+        message = {"transcript": [dict(entry) for entry in self.transcript]}
+        if audio:
+            message["audio"] = {
+                "mimeType": self.audio_mime_type,
+                "data": base64.b64encode(audio).decode("ascii"),
+            }
+        return {"catchUp": message}
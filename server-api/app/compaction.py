@@ -0,0 +1,355 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .config import GCS_BUCKET_NAME
+
+# Gemini output is logged once per user in the room (see gemini.py); these copies are collapsed
+DUPLICATED_SENDERS = ("Gemini", "GeminiText", "UserText (Transcribed)")
+# Raw protocol frames, which carry base64 audio/video
+RAW_SENDERS = ("Gemini", "User")
+# Per-user copies are logged in the same loop iteration, so they land well within this
+DEDUP_WINDOW_SECONDS = 1.0
+# Bytes buffered per open log file; a session's client files are read side by side
+READ_CHUNK_BYTES = 1024 * 1024
+# Flush a row group once either limit is reached
+ROW_GROUP_ROWS = 50_000
+ROW_GROUP_BYTES = 64 * 1024 * 1024
+# Raw log bytes per output part; a day's parts are compacted in parallel
+PART_TARGET_BYTES = 512 * 1024 * 1024
+
+MEDIA_DROP = "drop"
+MEDIA_EXTERNALIZE = "externalize"
+
+MESSAGES_SCHEMA = pa.schema([
+    ("session", pa.string()),
+    ("client", pa.string()),
+    ("sender", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("text", pa.string()),
+    ("finished", pa.bool_()),  # Transcriptions only
+    ("media_bytes", pa.int64()),  # Decoded size of the payloads stripped from the frame
+])
+
+MEDIA_SCHEMA = pa.schema([
+    ("session", pa.string()),
+    ("client", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("mime_type", pa.string()),
+    ("data", pa.binary()),
+])
+
+
+class PartitionWriter:
+    """Buffers rows column-wise and writes them to one Parquet file in bounded row groups."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema
+        self.columns = {name: [] for name in schema.names}
+        self.rows = 0
+        self.nbytes = 0
+        self.writer = None
+
+    def append(self, row, nbytes):
+        for name, column in self.columns.items():
+            column.append(row.get(name))
+        self.rows += 1
+        self.nbytes += nbytes
+        if self.rows >= ROW_GROUP_ROWS or self.nbytes >= ROW_GROUP_BYTES:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+        self.writer.write_batch(pa.record_batch(list(self.columns.values()), schema=self.schema))
+        self.columns = {name: [] for name in self.schema.names}
+        self.rows = 0
+        self.nbytes = 0
+
+    def close(self):
+        """Finishes the file; returns its path, or None if nothing was written."""
+        self.flush()
+        if self.writer is None:
+            return None
+        self.writer.close()
+        # Only complete partitions become visible, so a failed run never leaves half a day
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+
+def strip_media(value, payloads):
+    """
+    Replaces base64 payloads of inline media ({"mimeType"/"mime_type", "data"})
+    in a parsed frame with "" and collects (mime_type, bytes) into `payloads`.
+    """
+    if isinstance(value, dict):
+        mime_type = value.get("mimeType") or value.get("mime_type")
+        if mime_type and isinstance(value.get("data"), str):
+            try:
+                payloads.append((mime_type, base64.b64decode(value["data"])))
+            except ValueError:
+                payloads.append((mime_type, b""))
+            return {**value, "data": ""}
+        return {key: strip_media(item, payloads) for key, item in value.items()}
+    if isinstance(value, list):
+        return [strip_media(item, payloads) for item in value]
+    return value
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_log(blob, client_id, stats):
+    """Streams one client's log as (timestamp, client_id, message), in file order."""
+    try:
+        with blob.open("rt", chunk_size=READ_CHUNK_BYTES) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                stats["lines"] += 1
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    msg = None
+                timestamp = _parse_timestamp(msg.get("timestamp")) if isinstance(msg, dict) else None
+                if timestamp is None:
+                    stats["bad_lines"] += 1
+                    continue
+                yield timestamp, client_id, msg
+    except Exception as e:
+        print(f"⚠️ Error reading blob {blob.name}: {e}")
+
+
+class CopyFilter:
+    """
+    Drops the per-user copies of a Gemini frame. A message is a copy if another
+    client logged the same sender and text within DEDUP_WINDOW_SECONDS; the
+    same client repeating itself is kept. Only the window is held in memory.
+    """
+
+    def __init__(self):
+        self.recent = OrderedDict()  # (sender, digest) -> (timestamp, clients)
+
+    def is_copy(self, timestamp, client_id, sender, raw_text):
+        horizon = timestamp - datetime.timedelta(seconds=DEDUP_WINDOW_SECONDS)
+        while self.recent:
+            oldest_key, (oldest_ts, _) = next(iter(self.recent.items()))
+            if oldest_ts >= horizon:
+                break
+            del self.recent[oldest_key]
+
+        key = (sender, hashlib.blake2b(raw_text.encode("utf-8"), digest_size=16).digest())
+        entry = self.recent.get(key)
+        if entry and client_id not in entry[1]:
+            entry[1].add(client_id)
+            return True
+        self.recent[key] = (timestamp, {client_id})
+        self.recent.move_to_end(key)
+        return False
+
+
+def compact_session(session_id, blobs, messages, media, media_mode, stats):
+    """Merges a session's client logs by time and writes the deduplicated rows."""
+    streams = [_read_log(blob, blob.name.rsplit("/", 1)[-1][:-len(".jsonl")], stats) for blob in blobs]
+    copies = CopyFilter()
+
+    for timestamp, client_id, msg in heapq.merge(*streams, key=lambda item: item[0]):
+        sender = msg.get("sender") or ""
+        value = msg.get("text")
+        raw_text = value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+
+        if sender in DUPLICATED_SENDERS and copies.is_copy(timestamp, client_id, sender, raw_text):
+            stats["duplicates_dropped"] += 1
+            continue
+
+        row = {"session": session_id, "client": client_id, "sender": sender, "timestamp": timestamp, "media_bytes": 0}
+        if isinstance(value, dict):
+            # Transcriptions are logged as {"text": ..., "finished": ...}
+            row["text"] = value.get("text") or ""
+            row["finished"] = bool(value.get("finished"))
+        else:
+            row["text"] = raw_text
+            payloads = []
+            if sender in RAW_SENDERS:
+                try:
+                    frame = json.loads(raw_text)
+                except ValueError:
+                    frame = None
+                if frame is not None:
+                    stripped = strip_media(frame, payloads)
+                    if payloads:
+                        row["text"] = json.dumps(stripped)
+                        row["media_bytes"] = sum(len(data) for _, data in payloads)
+            stats["media_payloads"] += len(payloads)
+            if media_mode == MEDIA_EXTERNALIZE:
+                for mime_type, data in payloads:
+                    media.append({**row, "mime_type": mime_type, "data": data}, len(data))
+
+        messages.append(row, len(row["text"]))
+        stats["rows"] += 1
+
+
+def list_day_sessions(bucket, day):
+    """Lists sessions/{YYYY-MM}/{DD}/*/*.jsonl as [(session_id, [blob names], total bytes)]."""
+    prefix = f"sessions/{day:%Y-%m}/{day:%d}/"
+    # Listing is lexicographic, so each session's client files arrive together
+    blobs = (b for b in bucket.list_blobs(prefix=prefix) if b.name.endswith(".jsonl") and b.name.count("/") == 4)
+    sessions = []
+    for session_id, session_blobs in itertools.groupby(blobs, key=lambda b: b.name.split("/")[3]):
+        session_blobs = list(session_blobs)
+        sessions.append((session_id, [b.name for b in session_blobs], sum(b.size or 0 for b in session_blobs)))
+    return sessions
+
+
+def plan_parts(sessions, part_bytes=PART_TARGET_BYTES):
+    """
+    Groups a day's sessions into parts of about part_bytes of raw logs. A
+    session is never split, since its copies are only found across its files.
+    """
+    parts, current, current_bytes = [], [], 0
+    for session_id, names, size in sessions:
+        if current and current_bytes + size > part_bytes:
+            parts.append(current)
+            current, current_bytes = [], 0
+        current.append((session_id, names))
+        current_bytes += size
+    if current:
+        parts.append(current)
+    return parts
+
+
+def compact_part(bucket, day, part, sessions, out_dir, media_mode=MEDIA_DROP):
+    """
+    Compacts the given [(session_id, [blob names])] of one day into
+    {out_dir}/messages/date={day}/part-{part}.parquet (and media/ when externalizing).
+    Sessions are streamed one at a time, so memory doesn't grow with the part.
+    """
+    partition = f"date={day:%Y-%m-%d}"
+    filename = f"part-{part}.parquet"
+    messages = PartitionWriter(os.path.join(out_dir, "messages", partition, filename), MESSAGES_SCHEMA)
+    media = PartitionWriter(os.path.join(out_dir, "media", partition, filename), MEDIA_SCHEMA)
+    stats = {"day": f"{day:%Y-%m-%d}", "sessions": 0, "files": 0, "lines": 0, "bad_lines": 0,
+             "rows": 0, "duplicates_dropped": 0, "media_payloads": 0}
+
+    for session_id, names in sessions:
+        stats["sessions"] += 1
+        stats["files"] += len(names)
+        compact_session(session_id, [bucket.blob(name) for name in names], messages, media, media_mode, stats)
+
+    stats["outputs"] = [path for path in (messages.close(), media.close()) if path]
+    return stats
+
+
+def _compact_part_worker(bucket_name, day, part, sessions, out_dir, media_mode, upload):
+    # Each process builds its own client; they don't survive pickling
+    from .gcs import get_storage_client
+    bucket = get_storage_client().bucket(bucket_name)
+    stats = compact_part(bucket, day, part, sessions, out_dir, media_mode)
+
+    if upload:
+        for path in stats["outputs"]:
+            blob_name = "compacted/" + os.path.relpath(path, out_dir).replace(os.sep, "/")
+            bucket.blob(blob_name).upload_from_filename(path)
+            print(f"✅ Uploaded gs://{bucket_name}/{blob_name}")
+    return stats
+
+
+def _remove_stale_parts(bucket, day, out_dir, keep, upload):
+    """Deletes part files from an earlier run that this run didn't produce (local, and uploaded if upload)."""
+    partition = f"date={day:%Y-%m-%d}"
+    for dataset in ("messages", "media"):
+        directory = os.path.join(out_dir, dataset, partition)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.startswith("part-") and path not in keep:
+                    os.remove(path)
+        if upload:
+            keep_names = {"compacted/" + os.path.relpath(path, out_dir).replace(os.sep, "/") for path in keep}
+            for blob in bucket.list_blobs(prefix=f"compacted/{dataset}/{partition}/"):
+                if blob.name not in keep_names:
+                    blob.delete()
+
+
+def compact_range(bucket_name, start, end, out_dir, workers=4, media_mode=MEDIA_DROP, upload=False,
+                  part_bytes=PART_TARGET_BYTES):
+    """
+    Compacts every day from start to end (inclusive). Each day's sessions are
+    split into parts of about part_bytes, and parts run in parallel worker
+    processes, so one busy day doesn't serialize the whole run.
+    """
+    from .gcs import get_storage_client
+    bucket = get_storage_client().bucket(bucket_name)
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    plans = {day: plan_parts(list_day_sessions(bucket, day), part_bytes) for day in days}
+    print(f"🗜️ Compacting {len(days)} days of session logs in {sum(map(len, plans.values()))} parts "
+          f"with {workers} workers...")
+
+    totals = {"rows": 0, "duplicates_dropped": 0, "files": 0}
+    # spawn: storage clients and their connection pools aren't fork-safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            day: [executor.submit(_compact_part_worker, bucket_name, day, part, sessions, out_dir, media_mode, upload)
+                  for part, sessions in enumerate(parts)]
+            for day, parts in plans.items()
+        }
+        for day, day_futures in futures.items():
+            day_stats = {"sessions": 0, "files": 0, "lines": 0, "bad_lines": 0,
+                         "rows": 0, "duplicates_dropped": 0, "media_payloads": 0}
+            outputs = set()
+            for future in day_futures:
+                stats = future.result()
+                outputs.update(stats["outputs"])
+                for key in day_stats:
+                    day_stats[key] += stats[key]
+            # A re-run with fewer parts mustn't leave the old ones behind to be read twice
+            _remove_stale_parts(bucket, day, out_dir, outputs, upload)
+            if day_stats["files"]:
+                print(f"✅ {day:%Y-%m-%d}: {day_stats['rows']} rows from {day_stats['files']} files in "
+                      f"{day_stats['sessions']} sessions, {len(day_futures)} parts "
+                      f"({day_stats['duplicates_dropped']} copies dropped, "
+                      f"{day_stats['media_payloads']} media payloads, {day_stats['bad_lines']} bad lines)")
+            for key in totals:
+                totals[key] += day_stats[key]
+
+    print(f"✅ Compaction done: {totals['rows']} rows from {totals['files']} files "
+          f"({totals['duplicates_dropped']} copies dropped)")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact session logs into day-partitioned Parquet.")
+    parser.add_argument("--start", required=True, type=datetime.date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, help="Last day, inclusive (default: --start)")
+    parser.add_argument("--out", default="compacted", help="Local output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--media", choices=[MEDIA_DROP, MEDIA_EXTERNALIZE], default=MEDIA_DROP,
+                        help="Drop audio/video payloads or write them to a separate media/ dataset")
+    parser.add_argument("--upload", action="store_true", help="Also upload the files to gs://<bucket>/compacted/")
+    parser.add_argument("--part-mb", type=int, default=PART_TARGET_BYTES // (1024 * 1024),
+                        help="Raw log megabytes per output part; a day's parts are compacted in parallel")
+    parser.add_argument("--bucket", default=GCS_BUCKET_NAME)
+    args = parser.parse_args()
+
+    compact_range(args.bucket, args.start, args.end or args.start, args.out,
+                  workers=args.workers, media_mode=args.media, upload=args.upload,
+                  part_bytes=args.part_mb * 1024 * 1024)
@@ -6,3 +6,62 @@ DEBUG = False
 WS_PORT = int(os.environ.get("PORT", 8080))
 GCS_BUCKET_NAME = "mg-brian-knowledge"
 GEMINI_MODEL_ID = os.environ.get("GEMINI_MODEL_ID", "gemini-live-2.5-flash-native-audio")
+# Local transcript search index (see app/search_index.py)
+SEARCH_INDEX_DIR = os.environ.get("SEARCH_INDEX_DIR", "search_index")
+# Media governor (see app/media_governor.py). Video is decimated between these rates.
+VIDEO_MAX_FPS = float(os.environ.get("VIDEO_MAX_FPS", 2))
+VIDEO_MIN_FPS = float(os.environ.get("VIDEO_MIN_FPS", 0.2))
+UPSTREAM_LATENCY_BUDGET_MS = float(os.environ.get("UPSTREAM_LATENCY_BUDGET_MS", 250))
+UPSTREAM_MAX_IN_FLIGHT = int(os.environ.get("UPSTREAM_MAX_IN_FLIGHT", 4))
+# Room types. "text" rooms open their upstream on demand and suspend it when idle.
+ROOM_MODE_LIVE = "live"
+ROOM_MODE_TEXT = "text"
+ROOM_MODES = (ROOM_MODE_LIVE, ROOM_MODE_TEXT)
+TEXT_ROOM_IDLE_SECONDS = float(os.environ.get("TEXT_ROOM_IDLE_SECONDS", 60))
+TEXT_ROOM_RESUME_TIMEOUT = float(os.environ.get("TEXT_ROOM_RESUME_TIMEOUT", 10))
+# Admission control and rate limiting (see app/admission.py)
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 200))
+MAX_USERS_PER_SESSION = int(os.environ.get("MAX_USERS_PER_SESSION", 16))
+MAX_UPSTREAM_SOCKETS = int(os.environ.get("MAX_UPSTREAM_SOCKETS", 200))
+CLIENT_MSGS_PER_SECOND = float(os.environ.get("CLIENT_MSGS_PER_SECOND", 60))
+CLIENT_BYTES_PER_SECOND = float(os.environ.get("CLIENT_BYTES_PER_SECOND", 2 * 1024 * 1024))
+ROOM_MSGS_PER_SECOND = float(os.environ.get("ROOM_MSGS_PER_SECOND", 300))
+ROOM_BYTES_PER_SECOND = float(os.environ.get("ROOM_BYTES_PER_SECOND", 8 * 1024 * 1024))
+# Bucket capacity, in seconds of the sustained rate
+RATE_LIMIT_BURST_SECONDS = float(os.environ.get("RATE_LIMIT_BURST_SECONDS", 2))
+# Disconnect a client that stays over its own limit this long
+RATE_LIMIT_CLOSE_AFTER_SECONDS = float(os.environ.get("RATE_LIMIT_CLOSE_AFTER_SECONDS", 10))
+# Mix participants' microphones into one upstream stream (needs numpy). Rooms can override.
+AUDIO_MIXING = os.environ.get("AUDIO_MIXING", "false").lower() == "true"
+# Late-joiner catch-up buffer (see app/catchup.py)
+CATCHUP_AUDIO_SECONDS = float(os.environ.get("CATCHUP_AUDIO_SECONDS", 10))
+CATCHUP_TRANSCRIPT_ENTRIES = int(os.environ.get("CATCHUP_TRANSCRIPT_ENTRIES", 50))
+CATCHUP_ENTRY_MAX_CHARS = int(os.environ.get("CATCHUP_ENTRY_MAX_CHARS", 2000))
+# Server-side tools answered by the proxy (see app/tools.py), comma separated
+SERVER_TOOLS = [t.strip() for t in os.environ.get("SERVER_TOOLS", "").split(",") if t.strip()]
+TOOL_CACHE_TTL = float(os.environ.get("TOOL_CACHE_TTL", 300))
+TOOL_CACHE_SIZE = int(os.environ.get("TOOL_CACHE_SIZE", 512))
+# Seconds a client tool call waits for its designated responder before any participant's answer is accepted
+TOOL_RESPONDER_TIMEOUT = float(os.environ.get("TOOL_RESPONDER_TIMEOUT", 5))
+# Room storage and stale-room sweeping (see app/room_manager.py)
+ROOM_STORAGE_CONCURRENCY = int(os.environ.get("ROOM_STORAGE_CONCURRENCY", 16))
+ROOM_BATCH_MAX = int(os.environ.get("ROOM_BATCH_MAX", 500))
+# Open rooms with no activity for this long are closed; 0 disables the sweeper
+ROOM_IDLE_TTL_SECONDS = float(os.environ.get("ROOM_IDLE_TTL_SECONDS", 24 * 3600))
+ROOM_SWEEP_INTERVAL_SECONDS = float(os.environ.get("ROOM_SWEEP_INTERVAL_SECONDS", 3600))
+# Live rooms refresh last_active_at this often, so sweepers on other instances leave them alone
+ROOM_HEARTBEAT_SECONDS = float(os.environ.get("ROOM_HEARTBEAT_SECONDS", 600))
+# Production launch (python server.py --production, see app/serve.py)
+WORKERS = int(os.environ.get("WORKERS", 1))
+# Rooms live in process memory and nothing routes a room's users to one worker yet,
+# so WORKERS > 1 splits rooms unless this is set deliberately
+ALLOW_UNROUTED_WORKERS = os.environ.get("ALLOW_UNROUTED_WORKERS", "false").lower() == "true"
+SERVER_LOOP = os.environ.get("SERVER_LOOP", "auto")  # auto | uvloop | asyncio
+SERVER_HTTP = os.environ.get("SERVER_HTTP", "auto")  # auto | httptools | h11
+WS_PER_MESSAGE_DEFLATE = os.environ.get("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+WS_MAX_SIZE = int(os.environ.get("WS_MAX_SIZE", 8 * 1024 * 1024))
+# Cloud Run allows 10s between SIGTERM and SIGKILL; draining, closing connections
+# and flushing logs all have to fit in it
+SHUTDOWN_BUDGET_SECONDS = float(os.environ.get("SHUTDOWN_BUDGET_SECONDS", 10))
+# The part of the budget spent waiting for rooms to end on their own
+DRAIN_TIMEOUT_SECONDS = float(os.environ.get("DRAIN_TIMEOUT_SECONDS", 6))
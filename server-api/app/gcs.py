@@ -0,0 +1,18 @@
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_storage_client():
+    """
+    Returns the process-wide GCS client, creating it on first use.
+    google.cloud.storage is imported here rather than at module level because
+    the import alone is a large share of cold-start time on Cloud Run.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import storage
+                _client = storage.Client()
+    return _client
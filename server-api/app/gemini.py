@@ -1,26 +1,49 @@
 
 import asyncio
-import ssl
-import certifi
 import json
-import websockets
-from websockets.exceptions import ConnectionClosed
-from .config import DEBUG, GCS_BUCKET_NAME
-from .session import Session, broadcast_to_users
+import threading
+import time
+from .config import (
+    DEBUG,
+    GCS_BUCKET_NAME,
+    ROOM_MODE_TEXT,
+    TEXT_ROOM_IDLE_SECONDS,
+    TEXT_ROOM_RESUME_TIMEOUT,
+)
+from .auth import generate_access_token
+from .session import Session, sessions, broadcast_to_users
+from .admission import check_upstream
 from .logger import ConversationLogger
 
 # Initialize Logger (or pass it in?)
 # Singleton logger for simplicity
 logger = ConversationLogger(GCS_BUCKET_NAME)
 
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+def get_ssl_context():
+    """SSL context for the Gemini websocket, built once (loading the CA bundle is slow)."""
+    global _ssl_context
+    if _ssl_context is None:
+        with _ssl_context_lock:
+            if _ssl_context is None:
+                import ssl
+                import certifi
+                _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
 async def gemini_reader_task(session: Session):
     """
     Reads messages from Gemini and broadcasts them to all users in the session.
     """
+    from websockets.exceptions import ConnectionClosed
+    gemini_ws = session.gemini_ws
     try:
-        async for message in session.gemini_ws:
+        async for message in gemini_ws:
             if isinstance(message, bytes):
                 message = message.decode('utf-8')
+            session.touch()
             
             if DEBUG:
                 print(f"[Session: {session.session_id}] Received from Gemini: {len(message)} bytes")
@@ -33,6 +56,7 @@ async def gemini_reader_task(session: Session):
             # --- Text Extraction for Logs ---
             try:
                 data = json.loads(message)
+                session.catchup.record(data)
                 server_content = data.get("serverContent", {})
                 
                 # Check for Gemini's own transcription (Model Output)
@@ -58,6 +82,27 @@ async def gemini_reader_task(session: Session):
                 if DEBUG:
                     print(f"Logging text extraction failed: {e}")
 
+            # Keep the newest resumption handle so a suspended text room can continue the conversation
+            if '"sessionResumptionUpdate"' in message:
+                try:
+                    update = json.loads(message)["sessionResumptionUpdate"]
+                    if update.get("resumable", True) and update.get("newHandle"):
+                        session.resumption_handle = update["newHandle"]
+                except Exception:
+                    pass
+
+            # Server-side tools are answered here; clients only get the calls they must run
+            if '"toolCall"' in message:
+                message = await session.tool_dispatcher.handle_tool_call(message)
+                if message is None:
+                    continue
+
+            # Text rooms answer setup themselves (and replay it on resume), so
+            # the upstream's setupComplete only unblocks the pending send
+            if session.mode == ROOM_MODE_TEXT and '"setupComplete"' in message:
+                session.get_upstream_ready().set()
+                continue
+
             # Broadcast Gemini's response to ALL users
             await broadcast_to_users(session, message)
     except ConnectionClosed:
@@ -66,11 +111,12 @@ async def gemini_reader_task(session: Session):
         print(f"Error in gemini_reader_task for session {session.session_id}: {e}")
     finally:
         print(f"Gemini reader task ended for session {session.session_id}")
-        if session.gemini_ws:
-            try:
-                await session.gemini_ws.close()
-            except:
-                pass
+        try:
+            await gemini_ws.close()
+        except:
+            pass
+        # A suspended text room may already have reconnected; leave the new socket alone
+        if session.gemini_ws is gemini_ws:
             session.gemini_ws = None
             session.gemini_task = None
             if hasattr(session, 'setup_complete'):
@@ -86,23 +132,116 @@ async def connect_to_gemini(session: Session, bearer_token: str, service_url: st
         "Authorization": f"Bearer {bearer_token}",
     }
     
-    # Create SSL context with certifi certificates
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    import websockets
+    # Shared SSL context with certifi certificates (pre-warmed at startup)
+    ssl_context = get_ssl_context()
 
     print(f"Connecting session {session.session_id} to Gemini API...")
     try:
         session.gemini_ws = await websockets.connect(
             service_url,
             additional_headers=headers,
-            ssl=ssl_context,
+            ssl=ssl_context if service_url.startswith("wss://") else None,
             ping_interval=20,
             ping_timeout=20
         )
         print(f"✅ Connected session {session.session_id} to Gemini API")
         
         # Start reading from Gemini
+        session.touch()
         session.gemini_task = asyncio.create_task(gemini_reader_task(session))
-        
+
+        if session.mode == ROOM_MODE_TEXT:
+            session.idle_task = asyncio.create_task(idle_upstream_watchdog(session))
+
     except Exception as e:
         print(f"Failed to connect session {session.session_id} to Gemini API: {e}")
         raise
+
+async def idle_upstream_watchdog(session: Session):
+    """Closes a text room's upstream after TEXT_ROOM_IDLE_SECONDS without traffic in either direction."""
+    gemini_ws = session.gemini_ws
+    while session.gemini_ws is gemini_ws and gemini_ws is not None:
+        idle = time.monotonic() - session.last_activity
+        if idle < TEXT_ROOM_IDLE_SECONDS:
+            await asyncio.sleep(TEXT_ROOM_IDLE_SECONDS - idle)
+            continue
+
+        print(f"💤 Suspending idle upstream for text session {session.session_id} after {idle:.0f}s")
+        session.gemini_ws = None
+        session.gemini_task = None
+        session.idle_task = None
+        try:
+            await gemini_ws.close()
+        except:
+            pass
+        return
+
+async def resume_upstream(session: Session):
+    """
+    Opens (or reopens after suspension) a text room's upstream and replays the
+    stored setup message, waiting for Gemini's setupComplete before returning.
+    """
+    async with session.get_init_lock():
+        if session.gemini_ws:
+            return
+
+        rejection = check_upstream(sessions)
+        if rejection:
+            raise RuntimeError(rejection)
+
+        # Tokens expire; regenerate unless the client supplied its own
+        bearer_token = session.bearer_token or generate_access_token()
+        if not bearer_token:
+            raise RuntimeError("Failed to generate access token")
+
+        ready = session.get_upstream_ready()
+        ready.clear()
+        await connect_to_gemini(session, bearer_token, session.service_url)
+        if not session.setup_message:
+            return
+
+        handle = session.resumption_handle
+        try:
+            await session.gemini_ws.send(resumption_setup(session.setup_message, handle))
+            await asyncio.wait_for(ready.wait(), timeout=TEXT_ROOM_RESUME_TIMEOUT)
+        except BaseException:
+            # Don't leave later messages going to an upstream that never finished setup
+            print(f"❌ Upstream setup failed for text session {session.session_id}; closing it")
+            session.resumption_handle = None  # May have expired; replay the transcript next time
+            await close_upstream(session)
+            raise
+
+        if handle:
+            print(f"▶️ Resumed upstream conversation for text session {session.session_id}")
+        else:
+            # No handle (first open, or resumption unavailable): re-seed the recent transcript as history
+            turns = session.catchup.history_turns()
+            if turns:
+                await session.gemini_ws.send(json.dumps({"client_content": {"turns": turns, "turn_complete": False}}))
+            print(f"▶️ Upstream ready for text session {session.session_id} ({len(turns)} turns replayed)")
+
+def resumption_setup(setup_message, handle):
+    """The stored setup with the resumption handle (if any) filled in."""
+    if not handle:
+        return setup_message
+    data = json.loads(setup_message)
+    setup = data["setup"]
+    key = "sessionResumption" if "sessionResumption" in setup else "session_resumption"
+    setup[key] = {"handle": handle}
+    return json.dumps(data)
+
+async def close_upstream(session: Session):
+    """Closes the session's upstream and forgets it, stopping its reader and idle watchdog."""
+    gemini_ws = session.gemini_ws
+    session.gemini_ws = None
+    for task in (session.gemini_task, session.idle_task):
+        if task and task is not asyncio.current_task():
+            task.cancel()
+    session.gemini_task = None
+    session.idle_task = None
+    if gemini_ws:
+        try:
+            await gemini_ws.close()
+        except:
+            pass
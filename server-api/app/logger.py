@@ -3,21 +3,21 @@ import datetime
 import json
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from google.cloud import storage
+from .gcs import get_storage_client
+from .search_index import search_index
 
 class ConversationLogger:
     def __init__(self, bucket_name):
         self.bucket_name = bucket_name
         self.buffer = {} # {session_id: {client_id: [messages]}}
-        self.client = None
         self.bucket = None
         self.executor = ThreadPoolExecutor(max_workers=4)
+        self.pending = set()  # Writes and index updates in flight, so shutdown can wait for them
 
     def _get_bucket(self):
-        if not self.client:
+        if not self.bucket:
             try:
-                self.client = storage.Client()
-                self.bucket = self.client.bucket(self.bucket_name)
+                self.bucket = get_storage_client().bucket(self.bucket_name)
             except Exception as e:
                 print(f"❌ Failed to initialize GCS client: {e}")
                 return None
@@ -45,12 +45,28 @@ class ConversationLogger:
         session_data = self.buffer.pop(session_id)
         
         # Offload GCS write to thread pool
-        asyncio.get_event_loop().run_in_executor(
+        write = asyncio.get_event_loop().run_in_executor(
             self.executor, 
             self._write_to_gcs, 
             session_id, 
             session_data
         )
+        # Index transcripts locally so past sessions are searchable
+        index = asyncio.get_event_loop().run_in_executor(
+            self.executor,
+            self._index_session,
+            session_id,
+            session_data
+        )
+        for future in (write, index):
+            self.pending.add(future)
+            future.add_done_callback(self.pending.discard)
+
+    def _index_session(self, session_id, session_data):
+        try:
+            search_index.add_session(session_id, session_data)
+        except Exception as e:
+            print(f"❌ Failed to index session {session_id}: {e}")
 
     def _write_to_gcs(self, session_id, session_data):
         """Synchronous GCS write function."""
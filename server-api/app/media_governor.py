@@ -0,0 +1,139 @@
+import time
+from collections import deque
+from .config import (
+    VIDEO_MAX_FPS,
+    VIDEO_MIN_FPS,
+    UPSTREAM_LATENCY_BUDGET_MS,
+    UPSTREAM_MAX_IN_FLIGHT,
+)
+
+# Window used to compute the effective (forwarded) video fps
+FPS_WINDOW_SECONDS = 5.0
+# Don't retune the target fps more often than this
+ADJUST_INTERVAL_SECONDS = 1.0
+LATENCY_EWMA_ALPHA = 0.2
+# Accept frames slightly early so capture-timer jitter isn't mistaken for excess rate
+FRAME_INTERVAL_TOLERANCE = 0.9
+# Additive recovery per adjustment once the upstream keeps up
+FPS_RECOVERY_STEP = 0.25
+
+
+def media_chunks(data):
+    """Returns the media chunks of a realtimeInput frame (camelCase or snake_case), else []."""
+    if not isinstance(data, dict):
+        return []
+    realtime_input = data.get("realtimeInput") or data.get("realtime_input")
+    if not isinstance(realtime_input, dict):
+        return []
+    chunks = realtime_input.get("mediaChunks") or realtime_input.get("media_chunks") or []
+    # Newer protocol versions send a single "video" blob instead of mediaChunks
+    if "video" in realtime_input:
+        chunks = chunks + [realtime_input["video"]]
+    return chunks
+
+
+def chunk_mime_type(chunk):
+    return chunk.get("mimeType") or chunk.get("mime_type") or ""
+
+
+def is_video_frame(data):
+    """True only for frames made entirely of image/video chunks, so audio is never dropped."""
+    chunks = media_chunks(data)
+    if not chunks:
+        return False
+    return all(chunk_mime_type(c).startswith(("image/", "video/")) for c in chunks)
+
+
+class MediaGovernor:
+    """
+    Per-session video admission. Tracks how long sends to the shared upstream
+    take and how many are in flight; when the latency budget is exceeded the
+    target fps is halved, and it recovers slowly once the upstream keeps up.
+    Video frames above the target rate (per client) are dropped, as are all
+    video frames while the upstream queue is full. Audio always passes.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.target_fps = VIDEO_MAX_FPS
+        self.announced_fps = VIDEO_MAX_FPS
+        self.latency_ms = 0.0
+        self.in_flight = 0
+        self.last_adjust = 0.0
+        self.last_forwarded = {}  # client_id -> monotonic time of last forwarded frame
+        self.forwarded_times = deque()
+        self.frames_forwarded = 0
+        self.dropped_queue = 0
+        self.dropped_rate = 0
+
+    def admit_video(self, client_id):
+        """Decides whether a video frame from client_id should be forwarded."""
+        now = time.monotonic()
+        if self.in_flight >= UPSTREAM_MAX_IN_FLIGHT:
+            self.dropped_queue += 1
+            return False
+
+        last = self.last_forwarded.get(client_id)
+        if last is not None and now - last < FRAME_INTERVAL_TOLERANCE / self.target_fps:
+            self.dropped_rate += 1
+            return False
+
+        self.last_forwarded[client_id] = now
+        self.forwarded_times.append(now)
+        self._trim_window(now)
+        self.frames_forwarded += 1
+        return True
+
+    def begin_send(self):
+        self.in_flight += 1
+
+    def end_send(self, elapsed_seconds):
+        """
+        Records an upstream send. Returns True when the target fps changed
+        enough that clients should be told about it.
+        """
+        self.in_flight -= 1
+        elapsed_ms = elapsed_seconds * 1000
+        self.latency_ms += LATENCY_EWMA_ALPHA * (elapsed_ms - self.latency_ms)
+
+        now = time.monotonic()
+        if now - self.last_adjust < ADJUST_INTERVAL_SECONDS:
+            return False
+        self.last_adjust = now
+
+        if self.latency_ms > UPSTREAM_LATENCY_BUDGET_MS or self.in_flight >= UPSTREAM_MAX_IN_FLIGHT:
+            self.target_fps = max(VIDEO_MIN_FPS, self.target_fps / 2)
+        elif self.latency_ms < UPSTREAM_LATENCY_BUDGET_MS / 2:
+            self.target_fps = min(VIDEO_MAX_FPS, self.target_fps + FPS_RECOVERY_STEP)
+
+        if abs(self.target_fps - self.announced_fps) >= 0.1:
+            self.announced_fps = self.target_fps
+            return True
+        return False
+
+    def forget(self, client_id):
+        self.last_forwarded.pop(client_id, None)
+
+    def control_message(self):
+        return {"mediaControl": {"targetFps": round(self.target_fps, 2)}}
+
+    def _trim_window(self, now):
+        cutoff = now - FPS_WINDOW_SECONDS
+        while self.forwarded_times and self.forwarded_times[0] < cutoff:
+            self.forwarded_times.popleft()
+
+    def effective_fps(self):
+        self._trim_window(time.monotonic())
+        return len(self.forwarded_times) / FPS_WINDOW_SECONDS
+
+    def stats(self):
+        return {
+            "target_fps": round(self.target_fps, 2),
+            "effective_fps": round(self.effective_fps(), 2),
+            "upstream_latency_ms": round(self.latency_ms, 1),
+            "upstream_in_flight": self.in_flight,
+            "frames_forwarded": self.frames_forwarded,
+            "frames_dropped": self.dropped_queue + self.dropped_rate,
+            "frames_dropped_queue": self.dropped_queue,
+            "frames_dropped_rate": self.dropped_rate,
+        }
@@ -0,0 +1,27 @@
+from .session import sessions
+from . import admission
+from .tools import tool_metrics
+
+def collect_metrics():
+    """Snapshot of per-session runtime stats for the /metrics endpoint."""
+    return {
+        "sessions": {
+            session_id: {
+                "mode": session.mode,
+                "users": len(session.users),
+                "upstream_connected": session.gemini_ws is not None,
+                "media": session.media_governor.stats(),
+                "rate_limited_frames": session.rate_limiter.throttled_frames,
+                "audio_mixer": session.audio_mixer.stats() if session.audio_mixer else None,
+            }
+            for session_id, session in sessions.items()
+        },
+        "usage": {
+            "sessions": len(sessions),
+            "users": sum(len(s.users) for s in sessions.values()),
+            "upstream_sockets": admission.upstream_sockets_in_use(sessions),
+        },
+        "limits": admission.limits(),
+        "admission": dict(admission.stats),
+        "tools": tool_metrics(),
+    }
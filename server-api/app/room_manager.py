@@ -1,21 +1,25 @@
 
 import json
 import uuid
-from datetime import datetime
-from google.cloud import storage
-from .config import GCS_BUCKET_NAME
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from .gcs import get_storage_client
+from .config import GCS_BUCKET_NAME, ROOM_MODE_LIVE, ROOM_MODES, ROOM_STORAGE_CONCURRENCY
+
+# Read-modify-write attempts before giving up when other writers keep winning
+METADATA_WRITE_ATTEMPTS = 5
 
 class RoomManager:
     def __init__(self, bucket_name):
         self.bucket_name = bucket_name
-        self.client = None
         self.bucket = None
+        # Bounds how many GCS reads/writes bulk operations run at once
+        self.executor = ThreadPoolExecutor(max_workers=ROOM_STORAGE_CONCURRENCY)
 
     def _get_bucket(self):
-        if not self.client:
+        if not self.bucket:
             try:
-                self.client = storage.Client()
-                self.bucket = self.client.bucket(self.bucket_name)
+                self.bucket = get_storage_client().bucket(self.bucket_name)
             except Exception as e:
                 print(f"❌ Failed to initialize GCS client for RoomManager: {e}")
                 return None
@@ -38,8 +42,13 @@ class RoomManager:
         
         return bucket.blob(f"rooms/{month}/{day}/{room_id}/metadata.json")
 
-    def create_room(self, name=None):
-        """Creates a new room with OPEN status and an explicit name."""
+    def create_room(self, name=None, mode=ROOM_MODE_LIVE, audio_mixing=None):
+        """
+        Creates a new room with OPEN status, an explicit name and a room type (live or text).
+        audio_mixing overrides the server's AUDIO_MIXING default for this room when set.
+        """
+        if mode not in ROOM_MODES:
+            raise ValueError(f"Unknown room mode: {mode}")
         room_id = str(uuid.uuid4())
         # Force a default name if None or empty string to ensure the 'name' key always exists
         display_name = name if (name and name.strip()) else f"Room-{room_id[:8]}"
@@ -50,17 +59,50 @@ class RoomManager:
             "room_id": room_id,
             "name": display_name,
             "status": "open",
+            "mode": mode,
             "created_at": datetime.utcnow().isoformat(),
             "closed_at": None
         }
+        if audio_mixing is not None:
+            metadata["audio_mixing"] = audio_mixing
         self._save_metadata(room_id, metadata)
         print(f"✅ Room created successfully: {json.dumps(metadata)}")
         return metadata
 
+    def _pointer_blob(self, room_id):
+        # room-index/{room_id}.json holds the room's metadata path, which depends on its creation date
+        return self._get_bucket().blob(f"room-index/{room_id}.json")
+
+    def _write_pointer(self, room_id, blob):
+        self._pointer_blob(room_id).upload_from_string(json.dumps({"path": blob.name}), content_type="application/json")
+
+    def _find_blob(self, room_id):
+        """
+        Locates a room's metadata blob whatever day it was created on. Rooms
+        created before pointers existed are found by a listing once, after
+        which their pointer is written. Returns None if the room doesn't exist.
+        """
+        from google.api_core.exceptions import NotFound
+        bucket = self._get_bucket()
+        if not bucket:
+            return None
+        try:
+            path = json.loads(self._pointer_blob(room_id).download_as_text())["path"]
+            return bucket.blob(path)
+        except NotFound:
+            pass
+
+        blob = self._get_blob(room_id)
+        if not blob.exists():
+            blob = self._metadata_blobs().get(room_id)
+        if blob:
+            self._write_pointer(room_id, blob)
+        return blob
+
     def get_room(self, room_id):
         """Retrieves room metadata."""
-        blob = self._get_blob(room_id)
-        if not blob or not blob.exists():
+        blob = self._find_blob(room_id)
+        if not blob:
             return None
         
         try:
@@ -76,21 +118,9 @@ class RoomManager:
         if not bucket:
             return []
         
-        # List all blobs with prefix 'rooms/'
         # Structure is rooms/{month}/{day}/{id}/metadata.json
-        blobs = bucket.list_blobs(prefix="rooms/")
-        rooms = []
-        
-        for blob in blobs:
-            if blob.name.endswith("metadata.json"):
-                try:
-                    content = blob.download_as_text()
-                    metadata = json.loads(content)
-                    if metadata.get("status") == "open":
-                        rooms.append(metadata)
-                except Exception as e:
-                    print(f"⚠️ Error reading blob {blob.name}: {e}")
-                    continue
+        blobs = self._metadata_blobs().values()
+        rooms = [m for m in self.executor.map(self._read_blob, blobs) if m and m.get("status") == "open"]
         
         # Sort by creation time (descending)
         rooms.sort(key=lambda x: x.get("created_at", ""), reverse=True)
@@ -98,21 +128,148 @@ class RoomManager:
 
     def close_room(self, room_id):
         """Closes a room."""
-        metadata = self.get_room(room_id)
-        if not metadata:
+        blob = self._find_blob(room_id)
+        if not blob or not self._close_blob(blob):
             return False
-            
-        metadata["status"] = "closed"
-        metadata["closed_at"] = datetime.utcnow().isoformat()
-        # Pass created_at to ensure we save to the correct date folder
-        self._save_metadata(room_id, metadata, metadata.get("created_at"))
         print(f"🔒 Room closed: {room_id}")
         return True
 
+    def _metadata_blobs(self):
+        """Maps room_id -> metadata blob for every room, using a single listing."""
+        bucket = self._get_bucket()
+        if not bucket:
+            return {}
+        blobs = {}
+        for blob in bucket.list_blobs(prefix="rooms/"):
+            if blob.name.endswith("/metadata.json"):
+                blobs[blob.name.split("/")[-2]] = blob
+        return blobs
+
+    def _read_blob(self, blob):
+        try:
+            return json.loads(blob.download_as_text())
+        except Exception as e:
+            print(f"⚠️ Error reading blob {blob.name}: {e}")
+            return None
+
+    def _update_blob(self, blob, update):
+        """
+        Read-modify-write of a metadata blob, conditional on the generation that
+        was read so concurrent writers (touches, closes, other instances) can't
+        overwrite each other; retried on conflict. update(metadata) edits the
+        dict in place and returns False to skip writing. Returns the metadata
+        as last read, or None if it couldn't be read or written.
+        """
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+        for _ in range(METADATA_WRITE_ATTEMPTS):
+            try:
+                metadata = json.loads(blob.download_as_text())
+            except NotFound:
+                return None
+            except Exception as e:
+                print(f"⚠️ Error reading blob {blob.name}: {e}")
+                return None
+            if update(metadata) is False:
+                return metadata
+            try:
+                blob.upload_from_string(
+                    json.dumps(metadata),
+                    content_type="application/json",
+                    if_generation_match=blob.generation,
+                )
+                return metadata
+            except PreconditionFailed:
+                continue
+        print(f"⚠️ Gave up updating {blob.name} after {METADATA_WRITE_ATTEMPTS} conflicting writes")
+        return None
+
+    def _close_blob(self, blob, still_stale=None):
+        """
+        Marks the room stored in blob as closed. still_stale(metadata), if given,
+        is re-checked on every attempt so a room touched meanwhile stays open.
+        Returns the metadata if the room is closed, else None.
+        """
+        def close(metadata):
+            if metadata.get("status") == "closed":
+                return False
+            if still_stale and not still_stale(metadata):
+                return False
+            metadata["status"] = "closed"
+            metadata["closed_at"] = datetime.utcnow().isoformat()
+
+        metadata = self._update_blob(blob, close)
+        return metadata if metadata and metadata.get("status") == "closed" else None
+
+    def get_rooms(self, room_ids):
+        """Fetches many rooms at once. Returns (rooms, not_found_ids)."""
+        room_ids = list(dict.fromkeys(room_ids))
+        blobs = self._metadata_blobs()
+        found = [blobs[room_id] for room_id in room_ids if room_id in blobs]
+        rooms = [m for m in self.executor.map(self._read_blob, found) if m]
+        fetched = {m.get("room_id") for m in rooms}
+        return rooms, [room_id for room_id in room_ids if room_id not in fetched]
+
+    def create_rooms(self, specs):
+        """Creates many rooms at once from dicts of create_room() arguments."""
+        for spec in specs:
+            if spec.get("mode", ROOM_MODE_LIVE) not in ROOM_MODES:
+                raise ValueError(f"Unknown room mode: {spec['mode']}")
+        return list(self.executor.map(lambda spec: self.create_room(**spec), specs))
+
+    def close_rooms(self, room_ids):
+        """Closes many rooms at once. Returns (closed_ids, not_found_ids)."""
+        room_ids = list(dict.fromkeys(room_ids))
+        blobs = self._metadata_blobs()
+        found = [blobs[room_id] for room_id in room_ids if room_id in blobs]
+        closed = [m["room_id"] for m in self.executor.map(self._close_blob, found) if m]
+        print(f"🔒 Closed {len(closed)} rooms in bulk")
+        return closed, [room_id for room_id in room_ids if room_id not in closed]
+
+    def close_stale_rooms(self, idle_seconds, active_room_ids=()):
+        """
+        Closes open rooms whose last activity (or creation, if never active)
+        is older than idle_seconds. Rooms with a live session in this process
+        are skipped; live sessions elsewhere keep last_active_at fresh (see
+        startup.room_heartbeat). Returns the closed room ids.
+        """
+        cutoff = (datetime.utcnow() - timedelta(seconds=idle_seconds)).isoformat()
+        updated_cutoff = datetime.now(timezone.utc) - timedelta(seconds=idle_seconds)
+        blobs = self._metadata_blobs()
+        # Every touch rewrites the blob, so one updated since the cutoff can't be stale; skip reading it
+        candidates = [
+            blob for room_id, blob in blobs.items()
+            if room_id not in active_room_ids and (blob.updated is None or blob.updated < updated_cutoff)
+        ]
+
+        def is_stale(metadata):
+            if not metadata or metadata.get("status") != "open":
+                return False
+            last_active = metadata.get("last_active_at") or metadata.get("created_at") or ""
+            return last_active < cutoff
+
+        stale = [
+            blob for blob, metadata in zip(candidates, self.executor.map(self._read_blob, candidates))
+            if is_stale(metadata)
+        ]
+        closed = [m["room_id"] for m in self.executor.map(lambda blob: self._close_blob(blob, is_stale), stale) if m]
+        if closed:
+            print(f"🧹 Closed {len(closed)} stale rooms idle for more than {idle_seconds:.0f}s")
+        return closed
+
+    def mark_active(self, room_id, created_at):
+        """Records activity on a room (in the background) so the stale-room sweeper leaves it alone."""
+        self.executor.submit(self._touch, room_id, created_at)
+
+    def _touch(self, room_id, created_at):
+        blob = self._get_blob(room_id, created_at)
+        if blob:
+            self._update_blob(blob, lambda metadata: metadata.update(last_active_at=datetime.utcnow().isoformat()))
+
     def _save_metadata(self, room_id, metadata, created_at=None):
         blob = self._get_blob(room_id, created_at or metadata.get("created_at"))
         if blob:
             blob.upload_from_string(json.dumps(metadata), content_type="application/json")
+            self._write_pointer(room_id, blob)
 
     def ensure_room_exists(self, room_id):
         """
@@ -0,0 +1,476 @@
+import argparse
+import fcntl
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .config import GCS_BUCKET_NAME, SEARCH_INDEX_DIR
+
+# Senders whose text is worth searching (see gemini.py / websocket.py logging)
+INDEXED_SENDERS = ("GeminiText", "UserText (Transcribed)", "UserText (Direct)")
+# Transcriptions stream in as word fragments; consecutive ones are merged into one document
+STREAMED_SENDERS = ("GeminiText", "UserText (Transcribed)")
+# Size-tiered merging: segments are grouped by floor(log_MERGE_FACTOR(docs)), and a
+# tier is merged once it holds MERGE_FACTOR segments, so each document is rewritten
+# O(log n) times instead of on every merge
+MERGE_FACTOR = 8
+SNIPPET_RADIUS = 60
+
+TOKEN_RE = re.compile(r"\w+")
+POSTING_TYPE = "I"  # uint32 doc ids
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _text_of(value):
+    """Transcriptions are logged as {"text": ..., "finished": ...}; direct text as a plain string."""
+    if isinstance(value, dict):
+        return value.get("text") or ""
+    if isinstance(value, str):
+        return value
+    return ""
+
+
+def extract_documents(session_id, session_data):
+    """
+    Turns a {client_id: [messages]} buffer (as produced by ConversationLogger)
+    into searchable documents. Gemini frames are logged once per user, so the
+    per-user copies are collapsed here.
+    """
+    documents = []
+    seen = set()
+
+    for client_id, messages in session_data.items():
+        current = None
+        for msg in messages:
+            sender = msg.get("sender")
+            if sender not in INDEXED_SENDERS:
+                continue
+            text = _text_of(msg.get("text"))
+            if not text:
+                continue
+
+            if current and current["sender"] == sender and sender in STREAMED_SENDERS:
+                current["text"] += text
+            else:
+                current = {
+                    "room_id": session_id,
+                    "client_id": client_id,
+                    "timestamp": msg.get("timestamp", ""),
+                    "sender": sender,
+                    "text": text,
+                }
+                documents.append(current)
+
+            finished = isinstance(msg.get("text"), dict) and msg["text"].get("finished")
+            if finished or sender not in STREAMED_SENDERS:
+                current = None
+
+    unique = []
+    for doc in documents:
+        doc["text"] = doc["text"].strip()
+        key = (doc["sender"], doc["text"])
+        if doc["sender"] not in STREAMED_SENDERS:
+            # Direct text is only logged by its author, so repeats from others are real
+            key += (doc["client_id"],)
+        if not doc["text"] or key in seen:
+            continue
+        seen.add(key)
+        unique.append(doc)
+    return unique
+
+
+def make_snippet(text, terms):
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [p for p in positions if p >= 0]
+    start = min(positions) if positions else 0
+
+    begin = max(0, start - SNIPPET_RADIUS)
+    end = min(len(text), start + SNIPPET_RADIUS)
+    snippet = text[begin:end]
+    if begin > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
+
+
+class Segment:
+    """
+    One immutable chunk of the index on disk:
+      {name}.lex   JSON {term: [offset, count]} into the postings file
+      {name}.post  packed uint32 doc ids, sorted per term (memory-mapped)
+      {name}.docs  JSONL documents (memory-mapped)
+      {name}.doff  packed uint64 byte offsets of each line in .docs
+    """
+
+    def __init__(self, index_dir, name):
+        self.name = name
+        base = os.path.join(index_dir, name)
+
+        with open(base + ".lex", "r", encoding="utf-8") as f:
+            self.lexicon = json.load(f)
+
+        self.doc_offsets = array("Q")
+        with open(base + ".doff", "rb") as f:
+            self.doc_offsets.frombytes(f.read())
+
+        self._post_file = open(base + ".post", "rb")
+        self._post_mm = mmap.mmap(self._post_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.postings_view = memoryview(self._post_mm).cast(POSTING_TYPE)
+
+        self._docs_file = open(base + ".docs", "rb")
+        self._docs_mm = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def postings(self, term):
+        entry = self.lexicon.get(term)
+        if not entry:
+            return None
+        offset, count = entry
+        return self.postings_view[offset:offset + count]
+
+    def document(self, doc_id):
+        start = self.doc_offsets[doc_id]
+        end = self.doc_offsets[doc_id + 1]
+        return json.loads(self._docs_mm[start:end])
+
+    def documents(self):
+        for doc_id in range(len(self)):
+            yield self.document(doc_id)
+
+    def close(self):
+        self.postings_view.release()
+        self._post_mm.close()
+        self._post_file.close()
+        self._docs_mm.close()
+        self._docs_file.close()
+
+    @staticmethod
+    def write(index_dir, name, documents):
+        """
+        Writes documents as a new segment. Returns False if there was nothing to write.
+        Documents are stored oldest first, so doc ids ascend with time (search relies on it).
+        """
+        documents = sorted(documents, key=lambda doc: doc.get("timestamp", ""))
+        postings = {}
+        doc_offsets = array("Q", [0])
+        lines = []
+        size = 0
+
+        for doc_id, doc in enumerate(documents):
+            line = (json.dumps(doc) + "\n").encode("utf-8")
+            lines.append(line)
+            size += len(line)
+            doc_offsets.append(size)
+            for term in set(tokenize(doc["text"])):
+                postings.setdefault(term, []).append(doc_id)
+
+        if not postings:
+            return False
+
+        lexicon = {}
+        packed = array(POSTING_TYPE)
+        for term in sorted(postings):
+            ids = postings[term]
+            lexicon[term] = [len(packed), len(ids)]
+            packed.extend(ids)
+
+        base = os.path.join(index_dir, name)
+        with open(base + ".post", "wb") as f:
+            packed.tofile(f)
+        with open(base + ".docs", "wb") as f:
+            f.writelines(lines)
+        with open(base + ".doff", "wb") as f:
+            doc_offsets.tofile(f)
+        with open(base + ".lex", "w", encoding="utf-8") as f:
+            json.dump(lexicon, f, separators=(",", ":"))
+        return True
+
+    @staticmethod
+    def remove(index_dir, name):
+        for ext in (".lex", ".post", ".docs", ".doff"):
+            try:
+                os.remove(os.path.join(index_dir, name + ext))
+            except FileNotFoundError:
+                pass
+
+
+class TranscriptIndex:
+    """
+    Local inverted index over room transcripts. Each log flush appends a small
+    segment; segments of similar size are merged in the background (see
+    MERGE_FACTOR). Several processes may share the directory (server workers,
+    the rebuild CLI): writers serialize on a file lock and re-read the
+    manifest under it, and readers pick up a new manifest on their next search.
+    The manifest is replaced atomically, so readers always see a complete index.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.lock = threading.Lock()  # Guards self.segments for readers in this process
+        self.write_lock = threading.Lock()
+        self.merge_lock = threading.Lock()
+        self.segments = None
+        self.manifest_stat = None
+
+    def _manifest_path(self):
+        return os.path.join(self.index_dir, "manifest.json")
+
+    @contextmanager
+    def _exclusive(self):
+        """Serializes writers across threads and processes."""
+        with self.write_lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(os.path.join(self.index_dir, "index.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f).get("segments", [])
+        except FileNotFoundError:
+            return []
+
+    def _save_manifest(self, names):
+        """Caller holds _exclusive()."""
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segments": names}, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _refresh(self):
+        """Brings self.segments in line with the manifest on disk. Caller holds self.lock."""
+        try:
+            st = os.stat(self._manifest_path())
+            manifest_stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            manifest_stat = None
+        if self.segments is not None and manifest_stat == self.manifest_stat:
+            return
+
+        current = {segment.name: segment for segment in self.segments or []}
+        segments = []
+        for name in self._read_manifest():
+            segment = current.pop(name, None)
+            if segment is None:
+                try:
+                    segment = Segment(self.index_dir, name)
+                except Exception as e:
+                    print(f"⚠️ Skipping unreadable index segment {name}: {e}")
+                    continue
+            segments.append(segment)
+        for segment in current.values():
+            segment.close()
+        self.segments = segments
+        self.manifest_stat = manifest_stat
+
+    def _new_segment_name(self):
+        # Unique across processes sharing the directory
+        return f"seg-{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+
+    def _write_segment(self, documents):
+        """Writes documents to a new, not yet visible segment. Returns its name, or None."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        name = self._new_segment_name()
+        return name if Segment.write(self.index_dir, name, documents) else None
+
+    def _commit(self, add=(), remove=(), replace_all=False):
+        """
+        Applies a change to the manifest as it is on disk now, not as this
+        process last saw it. Returns False (and discards `add`) if a segment
+        in `remove` is already gone, e.g. another process merged it first.
+        """
+        with self._exclusive():
+            names = self._read_manifest()
+            if replace_all:
+                remove = names
+            elif not set(remove) <= set(names):
+                for name in add:
+                    Segment.remove(self.index_dir, name)
+                return False
+            self._save_manifest([name for name in names if name not in set(remove)] + list(add))
+            with self.lock:
+                self._refresh()
+            # Other processes may still have these mapped; unlinking is safe for them
+            for name in remove:
+                Segment.remove(self.index_dir, name)
+        return True
+
+    def add_session(self, session_id, session_data):
+        """Indexes a flushed session buffer. Safe to call from the logger's thread pool."""
+        documents = extract_documents(session_id, session_data)
+        if not documents:
+            return
+        name = self._write_segment(documents)
+        if name:
+            self._commit(add=[name])
+            self._merge_tiers()
+
+    def _merge_candidates(self):
+        with self.lock:
+            self._refresh()
+            tiers = {}
+            for segment in self.segments:
+                tier = int(math.log(max(len(segment), 1), MERGE_FACTOR))
+                tiers.setdefault(tier, []).append(segment.name)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier]
+        return None
+
+    def _merge_tiers(self):
+        """
+        Merges full tiers until none is left. Reading and writing happen
+        outside every lock, so searches and new flushes aren't held up; only
+        the manifest swap at the end is serialized.
+        """
+        if not self.merge_lock.acquire(blocking=False):
+            return  # Another thread in this process is already merging
+        try:
+            while True:
+                names = self._merge_candidates()
+                if not names:
+                    return
+                try:
+                    # Own handles: a concurrent refresh may close the shared ones
+                    inputs = [Segment(self.index_dir, name) for name in names]
+                except FileNotFoundError:
+                    continue  # Merged away by another process meanwhile
+                try:
+                    merged = self._write_segment([doc for segment in inputs for doc in segment.documents()])
+                    count = sum(len(segment) for segment in inputs)
+                finally:
+                    for segment in inputs:
+                        segment.close()
+                if self._commit(add=[merged] if merged else [], remove=names):
+                    print(f"🗂️ Search index merged {len(names)} segments ({count} documents)")
+        except Exception as e:
+            print(f"❌ Search index merge failed: {e}")
+        finally:
+            self.merge_lock.release()
+
+    def search(self, query, limit=20):
+        """Returns up to `limit` documents containing every term of `query`, newest first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        if limit <= 0:
+            return []
+
+        # Doc ids ascend with time inside a segment, so each segment yields its
+        # matches newest first; a k-way merge across segments stops after `limit`
+        # documents instead of decoding every match.
+        def newest_first(segment, matches):
+            for doc_id in matches:
+                doc = segment.document(doc_id)
+                yield doc.get("timestamp", ""), doc
+
+        hits = []
+        with self.lock:
+            self._refresh()
+            streams = []
+            for segment in self.segments:
+                lists = [segment.postings(term) for term in terms]
+                if any(p is None for p in lists):
+                    continue
+                lists.sort(key=len)
+                matches = set(lists[0])
+                for postings in lists[1:]:
+                    matches.intersection_update(postings)
+                    if not matches:
+                        break
+                if matches:
+                    streams.append(newest_first(segment, sorted(matches, reverse=True)))
+
+            merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+            hits = [doc for _, doc in itertools.islice(merged, limit)]
+
+        return [
+            {
+                "room_id": doc["room_id"],
+                "timestamp": doc["timestamp"],
+                "sender": doc["sender"],
+                "snippet": make_snippet(doc["text"], terms),
+            }
+            for doc in hits
+        ]
+
+    def rebuild(self, bucket, workers=8):
+        """
+        Re-indexes every log under sessions/{month}/{day}/{session_id}/{client_id}.jsonl,
+        downloading blobs in parallel. Replaces the whole local index.
+        """
+        blobs = [
+            b for b in bucket.list_blobs(prefix="sessions/")
+            if b.name.endswith(".jsonl") and b.name.count("/") == 4
+        ]
+        # Listing is lexicographic, so a session's client files (per day folder) are adjacent
+        groups = [list(group) for _, group in itertools.groupby(blobs, key=lambda b: b.name.rsplit("/", 1)[0])]
+        print(f"🔎 Rebuilding search index from {len(blobs)} log files with {workers} workers...")
+
+        def read_text_messages(blob):
+            """Streams a log, keeping only indexed messages; raw frames with media are never held."""
+            messages = []
+            try:
+                with blob.open("rt") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        msg = json.loads(line)
+                        if isinstance(msg, dict) and msg.get("sender") in INDEXED_SENDERS:
+                            messages.append(msg)
+            except Exception as e:
+                print(f"⚠️ Error reading blob {blob.name}: {e}")
+            return messages
+
+        def load_session(group):
+            session_id = group[0].name.split("/")[3]
+            session_data = {b.name.rsplit("/", 1)[-1][:-len(".jsonl")]: read_text_messages(b) for b in group}
+            return extract_documents(session_id, session_data)
+
+        documents = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for session_documents in executor.map(load_session, groups):
+                documents.extend(session_documents)
+
+        name = self._write_segment(documents)
+        self._commit(add=[name] if name else [], replace_all=True)
+        print(f"✅ Search index rebuilt: {len(documents)} documents from {len(groups)} sessions")
+        return len(documents)
+
+
+# Singleton
+search_index = TranscriptIndex(SEARCH_INDEX_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local transcript search index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Index all existing session logs in GCS")
+    rebuild_parser.add_argument("--workers", type=int, default=8)
+    rebuild_parser.add_argument("--bucket", default=GCS_BUCKET_NAME)
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        from .gcs import get_storage_client
+        search_index.rebuild(get_storage_client().bucket(args.bucket), workers=args.workers)
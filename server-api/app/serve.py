@@ -0,0 +1,159 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import signal
+import time
+import uvicorn
+from .config import (
+    WS_PORT, WORKERS, ALLOW_UNROUTED_WORKERS, SERVER_LOOP, SERVER_HTTP,
+    WS_PER_MESSAGE_DEFLATE, WS_MAX_SIZE, SHUTDOWN_BUDGET_SECONDS, DRAIN_TIMEOUT_SECONDS, SEARCH_INDEX_DIR,
+)
+
+# Import string used by worker processes, which load the app themselves
+APP_IMPORT = "server:app"
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that drains live rooms before shutting down. uvicorn's own
+    shutdown closes every WebSocket with 1012 straight away, so on the first
+    SIGTERM/SIGINT we stop admitting, let rooms wind down (see drain_sessions)
+    and only then hand over to the normal shutdown.
+    """
+
+    loop = None
+    draining = False
+
+    async def serve(self, sockets=None):
+        self.loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    def handle_exit(self, sig, frame):
+        if self.loop is None:
+            return super().handle_exit(sig, frame)
+        if self.draining:
+            # Already on the way out; drain_sessions is bounded by its timeout
+            return
+        self.draining = True
+        from . import startup
+        # Shared by the drain, uvicorn's own shutdown and the log flush in lifespan
+        startup.shutdown_deadline = time.monotonic() + SHUTDOWN_BUDGET_SECONDS
+        self.loop.call_soon_threadsafe(self.loop.create_task, self._drain_then_exit(sig, frame))
+
+    async def _drain_then_exit(self, sig, frame):
+        from .startup import drain_sessions
+        try:
+            await drain_sessions(DRAIN_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"❌ Drain failed: {e}")
+        super().handle_exit(sig, frame)
+
+
+def _resolve(choice, fast, fallback, module):
+    """Picks the fast implementation for "auto" when it's installed."""
+    if choice != "auto":
+        return choice
+    return fast if importlib.util.find_spec(module) else fallback
+
+
+def production_config(app=APP_IMPORT, port=WS_PORT):
+    """uvicorn settings for serving many concurrent WebSockets."""
+    return {
+        "app": app,
+        "host": "0.0.0.0",
+        "port": port,
+        "loop": _resolve(SERVER_LOOP, "uvloop", "asyncio", "uvloop"),
+        "http": _resolve(SERVER_HTTP, "httptools", "h11", "httptools"),
+        "ws": "websockets",
+        "ws_max_size": WS_MAX_SIZE,
+        "ws_per_message_deflate": WS_PER_MESSAGE_DEFLATE,
+        # Health checks and room API calls are short; don't let idle keep-alives pile up
+        "timeout_keep_alive": 5,
+        # Rooms were already drained; only what's left of the budget goes to closing connections
+        "timeout_graceful_shutdown": max(1, int(SHUTDOWN_BUDGET_SECONDS - DRAIN_TIMEOUT_SECONDS)),
+        "lifespan": "on",
+    }
+
+
+def _worker(config_kwargs, sock):
+    DrainingServer(uvicorn.Config(**config_kwargs)).run(sockets=[sock])
+
+
+def _supervise(config_kwargs, workers):
+    """
+    Runs `workers` server processes on one shared listening socket, restarts
+    any that crash, and forwards SIGTERM/SIGINT so each drains on shutdown.
+    """
+    config = uvicorn.Config(**config_kwargs)
+    sock = config.bind_socket()
+    spawn = multiprocessing.get_context("spawn")
+    processes = []
+    stopping = False
+
+    def start():
+        process = spawn.Process(target=_worker, args=(config_kwargs, sock))
+        process.start()
+        print(f"👷 Started worker {process.pid}")
+        return process
+
+    def stop(sig, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        print(f"🛑 Received {signal.Signals(sig).name}, draining {len(processes)} workers...")
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes.extend(start() for _ in range(workers))
+    while not stopping:
+        for i, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                print(f"⚠️  Worker {process.pid} exited with code {process.exitcode}, restarting")
+                processes[i] = start()
+        time.sleep(0.5)
+
+    for process in processes:
+        process.join(SHUTDOWN_BUDGET_SECONDS)
+        if process.is_alive():
+            process.kill()
+    sock.close()
+    print("👋 All workers stopped")
+
+
+def run_production(app=None, workers=WORKERS):
+    """
+    Production entry point: uvloop + httptools when available, per-message
+    deflate, bounded frame size, graceful drain, and optional multiple workers.
+    """
+    config_kwargs = production_config()
+    print(f"⚙️  Serving with loop={config_kwargs['loop']} http={config_kwargs['http']} "
+          f"deflate={config_kwargs['ws_per_message_deflate']} max_frame={config_kwargs['ws_max_size']}B "
+          f"workers={workers}")
+
+    if workers <= 1:
+        # Reuse the already-imported app instead of importing it a second time
+        if app is not None:
+            config_kwargs["app"] = app
+        DrainingServer(uvicorn.Config(**config_kwargs)).run()
+        return
+
+    # Rooms, admission counters and the mixer live in process memory, so users
+    # of one room must reach the same worker to share a session. Nothing routes
+    # by room yet, so this is only safe when each room has a single user. The
+    # search index directory is shared: writers serialize on its file lock and
+    # every worker picks up the others' segments (see TranscriptIndex).
+    if not ALLOW_UNROUTED_WORKERS:
+        raise SystemExit(f"❌ WORKERS={workers} would split rooms across processes: connections aren't routed "
+                         "by room, so participants of one room can land on different workers. Run one worker "
+                         "per instance, or set ALLOW_UNROUTED_WORKERS=true if every room has a single user.")
+    print("⚠️  ALLOW_UNROUTED_WORKERS is set: rooms are per-process, so participants of a room "
+          "only meet if their connections land on the same worker")
+    print(f"🔎 Workers share the search index in {SEARCH_INDEX_DIR}; index writes are "
+          "serialized with a file lock, and admission limits apply per worker")
+    _supervise(config_kwargs, workers)
@@ -1,15 +1,35 @@
 
 import asyncio
-from .config import DEBUG
+import time
+from .config import DEBUG, ROOM_MODE_LIVE
+from .media_governor import MediaGovernor
+from .admission import RoomRateLimiter
+from .catchup import CatchupBuffer
+from .tools import ToolDispatcher
 
 class Session:
-    def __init__(self, session_id):
+    def __init__(self, session_id, mode=ROOM_MODE_LIVE, created_at=None):
         self.session_id = session_id
+        self.mode = mode
+        self.created_at = created_at  # Room creation time, locates its metadata in GCS
         self.users = set()  # Set of client websockets
         self.user_ids = {}  # Map websockets to client_ids
         self.gemini_ws = None
         self.gemini_task = None
         self.cleanup_task = None
+        self.media_governor = MediaGovernor(session_id)
+        self.rate_limiter = RoomRateLimiter()
+        self.audio_mixer = None
+        self.catchup = CatchupBuffer()
+        self.tool_dispatcher = ToolDispatcher(self)
+        # Text rooms keep what they need to reopen a suspended upstream
+        self.setup_message = None
+        self.bearer_token = None
+        self.service_url = None
+        self.last_activity = time.monotonic()
+        self.idle_task = None
+        self.upstream_ready = None
+        self.resumption_handle = None  # Latest Live API session resumption handle
         # Init lock created on demand or here? 
         # Better here but need to ensure we run in async context if creating Lock immediately? 
         # asyncio.Lock() is bound to the loop. 
@@ -21,6 +41,14 @@ class Session:
             self.init_lock = asyncio.Lock()
         return self.init_lock
 
+    def get_upstream_ready(self):
+        if self.upstream_ready is None:
+            self.upstream_ready = asyncio.Event()
+        return self.upstream_ready
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
 # Global registry
 sessions = {}
 
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from .config import ROOM_IDLE_TTL_SECONDS, ROOM_SWEEP_INTERVAL_SECONDS, ROOM_HEARTBEAT_SECONDS, SHUTDOWN_BUDGET_SECONDS
+
+# Close code for clients still connected when draining ends; they reconnect elsewhere
+CLOSE_SERVICE_RESTART = 1012
+
+# time.monotonic() by which shutdown must be finished; set on SIGTERM (see serve.DrainingServer)
+shutdown_deadline = None
+
+def _prewarm_blocking():
+    """Loads the slow dependencies a first join needs, so the first user doesn't pay for them."""
+    from .gemini import get_ssl_context
+    from .gcs import get_storage_client
+    from .auth import generate_access_token
+
+    # The room manager and logger buckets both come from the shared storage client
+    steps = [
+        ("websockets", lambda: __import__("websockets")),
+        ("SSL context", get_ssl_context),
+        ("GCS client", get_storage_client),
+        ("credentials", generate_access_token),
+    ]
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            # Some steps report failure by returning None rather than raising
+            if step() is None:
+                raise RuntimeError("no result")
+            print(f"🔥 Pre-warmed {name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            print(f"⚠️ Pre-warm of {name} failed: {e}")
+
+async def stale_room_sweeper():
+    """Periodically closes rooms that have been idle longer than ROOM_IDLE_TTL_SECONDS."""
+    from .room_manager import room_manager
+    from .session import sessions
+
+    while True:
+        await asyncio.sleep(ROOM_SWEEP_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(room_manager.close_stale_rooms, ROOM_IDLE_TTL_SECONDS, set(sessions))
+        except Exception as e:
+            print(f"⚠️ Stale room sweep failed: {e}")
+
+async def room_heartbeat():
+    """
+    Periodically refreshes last_active_at for rooms with a live session here.
+    Sweepers on other instances or workers only know about their own sessions,
+    so without this a long session elsewhere would look idle and be closed.
+    """
+    from .room_manager import room_manager
+    from .session import sessions
+
+    while True:
+        await asyncio.sleep(ROOM_HEARTBEAT_SECONDS)
+        for session in list(sessions.values()):
+            if session.users:
+                room_manager.mark_active(session.session_id, session.created_at)
+
+async def drain_sessions(timeout):
+    """
+    Stops admitting new users, gives live rooms up to `timeout` seconds to end
+    on their own, then closes whoever is left with 1012 so their clients
+    reconnect to another instance. Buffered conversation logs are flushed.
+    """
+    from . import admission
+    from .session import sessions, broadcast_to_users
+    from .gemini import logger
+
+    admission.draining = True
+    active = [s for s in sessions.values() if s.users]
+    print(f"🚰 Draining {len(active)} active sessions (up to {timeout:.0f}s)...")
+
+    notice = json.dumps({"draining": {"deadlineMs": int(timeout * 1000)}})
+    await asyncio.gather(*(broadcast_to_users(s, notice) for s in active), return_exceptions=True)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while any(s.users for s in sessions.values()) and loop.time() < deadline:
+        await asyncio.sleep(0.25)
+
+    remaining = [ws for s in sessions.values() for ws in list(s.users)]
+    if remaining:
+        print(f"🚰 Drain timeout reached; handing off {len(remaining)} clients")
+    for ws in remaining:
+        try:
+            await ws.close(code=CLOSE_SERVICE_RESTART, reason="Server restarting")
+        except Exception:
+            pass
+
+    for session_id in list(logger.buffer):
+        logger.flush_session_logs(session_id)
+    print("✅ Drain complete")
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    FastAPI lifespan hook. The server starts accepting requests immediately;
+    heavy clients are created in a background thread instead of at import time
+    or on the first request.
+    """
+    warmup = asyncio.create_task(asyncio.to_thread(_prewarm_blocking))
+    app.state.warmup = warmup
+    background = []
+    if ROOM_IDLE_TTL_SECONDS > 0 and ROOM_SWEEP_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(stale_room_sweeper()))
+    if ROOM_IDLE_TTL_SECONDS > 0 and ROOM_HEARTBEAT_SECONDS > 0:
+        if ROOM_HEARTBEAT_SECONDS >= ROOM_IDLE_TTL_SECONDS:
+            print("⚠️  ROOM_HEARTBEAT_SECONDS should be well below ROOM_IDLE_TTL_SECONDS, "
+                  "or live rooms on other instances may be swept")
+        background.append(asyncio.create_task(room_heartbeat()))
+    yield
+    if not warmup.done():
+        warmup.cancel()
+    for task in background:
+        task.cancel()
+
+    # Don't lose conversation logs still being written when the process exits,
+    # but don't outlive the shutdown budget waiting for them either
+    from .gemini import logger
+    for session_id in list(logger.buffer):
+        logger.flush_session_logs(session_id)
+    deadline = shutdown_deadline or time.monotonic() + SHUTDOWN_BUDGET_SECONDS
+    remaining = deadline - time.monotonic()
+    if logger.pending and remaining > 0:
+        await asyncio.wait(set(logger.pending), timeout=remaining)
+    unfinished = [future for future in logger.pending if not future.done()]
+    if unfinished:
+        print(f"⚠️ Shutdown budget used up with {len(unfinished)} log writes unfinished; dropping those not started")
+    logger.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,316 @@
+import asyncio
+import inspect
+import json
+import time
+from collections import OrderedDict
+from .config import SERVER_TOOLS, TOOL_CACHE_TTL, TOOL_CACHE_SIZE, TOOL_RESPONDER_TIMEOUT
+
+# Remember this many answered/pending call ids per session for deduplication
+MAX_TRACKED_CALLS = 256
+# Upper bound on search_past_sessions results, whatever the model asks for
+MAX_SEARCH_RESULTS = 20
+
+# Registered server-side tools: name -> {"fn", "declaration", "ttl"}
+server_tools = {}
+
+# Process-wide per-tool latency stats reported by /metrics
+tool_stats = {}
+
+
+def _entry(name, where):
+    return tool_stats.setdefault(name, {
+        "where": where,
+        "calls": 0,
+        "cache_hits": 0,
+        "duplicates_dropped": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+    })
+
+
+def _record(name, elapsed, where, cache_hit=False):
+    entry = _entry(name, where)
+    entry["calls"] += 1
+    entry["cache_hits"] += int(cache_hit)
+    elapsed_ms = elapsed * 1000
+    entry["total_ms"] += elapsed_ms
+    entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+
+def tool_metrics():
+    return {
+        name: dict(entry, avg_ms=round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0)
+        for name, entry in tool_stats.items()
+    }
+
+
+class ToolResultCache:
+    """Memoized tool results with a per-entry TTL and LRU eviction."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (expires_at, result)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result, ttl):
+        self.entries[key] = (time.monotonic() + ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+result_cache = ToolResultCache(TOOL_CACHE_SIZE)
+
+
+def server_tool(name, description, parameters, required=None, ttl=TOOL_CACHE_TTL):
+    """
+    Registers a Python function as a server-side tool. Its declaration is added
+    to the room's setup when the name is listed in SERVER_TOOLS, and calls to it
+    are answered by the proxy instead of the clients. ttl=0 disables caching.
+    """
+    def decorator(fn):
+        server_tools[name] = {
+            "fn": fn,
+            "declaration": {
+                "name": name,
+                "description": description,
+                "parameters": {"required": required or [], **parameters},
+            },
+            "ttl": ttl,
+        }
+        return fn
+    return decorator
+
+
+def enabled_tool(name):
+    return server_tools.get(name) if name in SERVER_TOOLS else None
+
+
+def _coerce(name, value, schema):
+    kind = schema.get("type")
+    if kind == "integer":
+        # JSON numbers from function calls may arrive as floats (5.0)
+        if isinstance(value, bool) or float(value) != int(float(value)):
+            raise ValueError(f"{name} must be an integer")
+        return int(float(value))
+    if kind == "number":
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number")
+        return float(value)
+    if kind == "boolean":
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be a boolean")
+        return value
+    if kind == "string":
+        return value if isinstance(value, str) else str(value)
+    return value
+
+
+def coerce_args(declaration, args):
+    """
+    Checks call arguments against a tool's declared parameters: required ones
+    must be present, scalars are converted to the declared type, and
+    undeclared ones are dropped. Raises ValueError on anything unusable.
+    """
+    if not isinstance(args, dict):
+        raise ValueError("arguments must be an object")
+    parameters = declaration["parameters"]
+    properties = parameters.get("properties", {})
+    missing = [name for name in parameters.get("required", []) if args.get(name) is None]
+    if missing:
+        raise ValueError(f"missing required arguments: {', '.join(missing)}")
+
+    coerced = {}
+    for name, value in args.items():
+        if name not in properties or value is None:
+            continue
+        try:
+            coerced[name] = _coerce(name, value, properties[name])
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(str(e) if str(e).startswith(name) else f"{name} has the wrong type") from None
+    return coerced
+
+
+def server_tool_declarations():
+    return [server_tools[name]["declaration"] for name in SERVER_TOOLS if name in server_tools]
+
+
+async def run_server_tool(name, args):
+    """Runs an enabled server tool through the result cache."""
+    tool = enabled_tool(name)
+    started = time.perf_counter()
+    try:
+        args = coerce_args(tool["declaration"], args)
+    except ValueError as e:
+        print(f"❌ Server tool {name} got bad arguments: {e}")
+        _record(name, time.perf_counter() - started, "server")
+        return {"error": str(e)}
+
+    # Keyed on the coerced arguments, so limit=5 and limit=5.0 share an entry
+    key = (name, json.dumps(args, sort_keys=True))
+    if tool["ttl"] > 0:
+        cached = result_cache.get(key)
+        if cached is not None:
+            _record(name, time.perf_counter() - started, "server", cache_hit=True)
+            return cached
+
+    try:
+        if inspect.iscoroutinefunction(tool["fn"]):
+            result = await tool["fn"](**args)
+        else:
+            result = await asyncio.to_thread(tool["fn"], **args)
+    except Exception as e:
+        print(f"❌ Server tool {name} failed: {e}")
+        result = {"error": str(e)}
+    else:
+        if tool["ttl"] > 0:
+            result_cache.put(key, result, tool["ttl"])
+
+    _record(name, time.perf_counter() - started, "server")
+    return result
+
+
+def _response_ids(data):
+    """Call ids answered by a client tool response (web client or API shape)."""
+    response = data.get("toolResponse") or data.get("tool_response") or {}
+    if "id" in response:
+        return [response["id"]]
+    responses = response.get("functionResponses") or response.get("function_responses") or []
+    return [r.get("id") for r in responses if r.get("id")]
+
+
+class ToolDispatcher:
+    """
+    Per-session tool call routing. Calls to enabled server tools are answered
+    here; the rest are broadcast as before, but only one participant's answer
+    per call id is forwarded upstream: the longest-connected user at the time
+    of the call, or whoever answers first if that user has left or hasn't
+    answered within TOOL_RESPONDER_TIMEOUT.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.pending = OrderedDict()  # call id -> {"name", "started", "deadline", "responder"}
+        self.answered = OrderedDict()  # call id -> tool name, bounded
+        self.tasks = set()  # Running server-side calls; referenced so they aren't collected mid-run
+
+    def _track(self, table, call_id, value):
+        table[call_id] = value
+        while len(table) > MAX_TRACKED_CALLS:
+            table.popitem(last=False)
+
+    async def handle_tool_call(self, message):
+        """
+        Takes a Gemini toolCall frame. Starts server-side calls and returns the
+        frame clients should receive (only client-side calls), or None if
+        there is nothing left for them.
+        """
+        data = json.loads(message)
+        calls = data["toolCall"].get("functionCalls") or []
+        client_calls = []
+        responder = next(iter(self.session.user_ids.values()), None)
+
+        for call in calls:
+            if enabled_tool(call.get("name")):
+                task = asyncio.create_task(self._answer(call))
+                self.tasks.add(task)
+                task.add_done_callback(self._task_done)
+            else:
+                client_calls.append(call)
+                if call.get("id"):
+                    started = time.perf_counter()
+                    self._track(self.pending, call["id"], {
+                        "name": call.get("name"),
+                        "started": started,
+                        "deadline": started + TOOL_RESPONDER_TIMEOUT,
+                        "responder": responder,
+                    })
+
+        if not client_calls:
+            return None
+        if len(client_calls) == len(calls):
+            return message
+        data["toolCall"]["functionCalls"] = client_calls
+        return json.dumps(data)
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"❌ Server tool call failed for session {self.session.session_id}: {task.exception()}")
+
+    def cancel(self):
+        """Cancels server-side calls still running when the session ends."""
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def _answer(self, call):
+        result = await run_server_tool(call["name"], call.get("args") or {})
+        response = {
+            "toolResponse": {
+                "functionResponses": [{"id": call.get("id"), "name": call["name"], "response": result}]
+            }
+        }
+        if self.session.gemini_ws:
+            await self.session.gemini_ws.send(json.dumps(response))
+
+    def accept_response(self, client_id, data):
+        """True if this client's tool response should be forwarded upstream."""
+        ids = _response_ids(data)
+        if not ids:
+            return True
+
+        accepted = False
+        present = set(self.session.user_ids.values())
+        now = time.perf_counter()
+        for call_id in ids:
+            if call_id in self.answered:
+                continue
+            call = self.pending.get(call_id)
+            if call is None:
+                # Not a call we routed (e.g. tracked ids rolled over); don't block it
+                accepted = True
+                continue
+            # A responder that's present but silent (no handler, stuck tab) only holds the call until its deadline
+            if call["responder"] != client_id and call["responder"] in present and now < call["deadline"]:
+                continue
+            accepted = True
+            del self.pending[call_id]
+            self._track(self.answered, call_id, call["name"])
+            _record(call["name"], time.perf_counter() - call["started"], "client")
+
+        if not accepted:
+            name = self.answered.get(ids[0]) or (self.pending.get(ids[0]) or {}).get("name") or "unknown"
+            _entry(name, "client")["duplicates_dropped"] += 1
+        return accepted
+
+
+# --- Built-in server tools ---
+
+@server_tool(
+    "search_past_sessions",
+    "Searches transcripts of past sessions in this studio and returns matching snippets with their room and time.",
+    {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "Words to search for"},
+            "limit": {"type": "integer", "description": "Maximum number of results (default 5)"},
+        },
+    },
+    required=["query"],
+    ttl=60,
+)
+def search_past_sessions(query, limit=5):
+    from .search_index import search_index
+    return {"results": search_index.search(query, max(1, min(int(limit), MAX_SEARCH_RESULTS)))}
@@ -1,14 +1,30 @@
 
 import asyncio
 import json
+import time
 import uuid
-import websockets
 from fastapi import WebSocket, WebSocketDisconnect
-from .config import GEMINI_MODEL_ID
+from .config import GEMINI_MODEL_ID, VIDEO_MAX_FPS, ROOM_MODE_LIVE, ROOM_MODE_TEXT, AUDIO_MIXING
 from .room_manager import room_manager
 from .auth import generate_access_token
 from .session import sessions, Session, broadcast_to_users
-from .gemini import connect_to_gemini, logger
+from .gemini import connect_to_gemini, resume_upstream, logger
+from .media_governor import is_video_frame
+from .tools import server_tool_declarations
+from .admission import (
+    ClientRateLimiter,
+    check_join,
+    check_upstream,
+    stats as admission_stats,
+    CLOSE_TRY_AGAIN_LATER,
+    CLOSE_POLICY_VIOLATION,
+)
+
+async def send_catchup(session: Session, client_websocket: WebSocket) -> None:
+    """Sends the session's recent transcript and audio to a client that just joined."""
+    snapshot = session.catchup.snapshot()
+    if snapshot:
+        await client_websocket.send_text(json.dumps(snapshot))
 
 async def handle_websocket_client(client_websocket: WebSocket) -> None:
     """
@@ -28,11 +44,21 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
         service_setup_message_data = json.loads(service_setup_message)
 
         bearer_token = service_setup_message_data.get("bearer_token")
+        client_bearer_token = bearer_token
         service_url = service_setup_message_data.get("service_url")
         session_id = service_setup_message_data.get("session_id", "default")
         
         log_prefix = f"[Session: {session_id}] [Client: {client_id}]"
 
+        # --- Admission Control ---
+        # Before any storage or token work, so a full server sheds load cheaply
+        rejection = check_join(sessions, session_id)
+        if rejection:
+            print(f"{log_prefix} ❌ {rejection}. Rejecting connection.")
+            await client_websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=rejection)
+            return
+        # -------------------------
+
         # --- Room Management Check ---
         room_meta = room_manager.ensure_room_exists(session_id)
         if room_meta.get("status") == "closed":
@@ -62,9 +88,20 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
         # Get or create session
         if session_id not in sessions:
             print(f"{log_prefix} Creating new session")
-            sessions[session_id] = Session(session_id)
+            sessions[session_id] = Session(
+                session_id,
+                mode=room_meta.get("mode", ROOM_MODE_LIVE),
+                created_at=room_meta.get("created_at"),
+            )
+            room_manager.mark_active(session_id, room_meta.get("created_at"))
         
         session = sessions[session_id]
+
+        if session.audio_mixer is None and session.mode == ROOM_MODE_LIVE and room_meta.get("audio_mixing", AUDIO_MIXING):
+            # Imported here so numpy is only loaded when mixing is in use
+            from .audio_mixer import AudioMixer
+            session.audio_mixer = AudioMixer(session)
+            print(f"{log_prefix} 🎚️ Audio mixing enabled for session")
         
         # If there's a pending cleanup task for this session, cancel it!
         if session.cleanup_task:
@@ -84,22 +121,60 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
         #      session.init_lock = asyncio.Lock()
         init_lock = session.get_init_lock()
         
-        async with init_lock:
-             if not session.gemini_ws:
-                 await connect_to_gemini(session, bearer_token, service_url)
+        if session.mode == ROOM_MODE_TEXT:
+             # Text rooms connect on the first message and suspend when idle
+             session.bearer_token = client_bearer_token
+             session.service_url = service_url
+        else:
+             async with init_lock:
+                  if not session.gemini_ws:
+                      rejection = check_upstream(sessions)
+                      if rejection:
+                          print(f"{log_prefix} ❌ {rejection}. Rejecting connection.")
+                          await client_websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=rejection)
+                          return
+                      await connect_to_gemini(session, bearer_token, service_url)
+
+        # Tell the new joiner the current video budget if it's been lowered
+        governor = session.media_governor
+        if governor.target_fps < VIDEO_MAX_FPS:
+            await client_websocket.send_text(json.dumps(governor.control_message()))
+
+        rate_limiter = ClientRateLimiter(session.rate_limiter)
 
         # Main loop: Read from client, forward to Gemini, Broadcast to others
         # FastAPI's iter_text() yields strings
         try:
             async for message in client_websocket.iter_text():
                 # message is already a string
+
+                # Rate limit before doing any work on the frame
+                throttled = rate_limiter.check(len(message))
+                if throttled:
+                    if rate_limiter.should_close():
+                        print(f"{log_prefix} ❌ Rate limit exceeded for too long. Disconnecting.")
+                        admission_stats["rate_limit_closes"] += 1
+                        await client_websocket.close(code=CLOSE_POLICY_VIOLATION, reason="Rate limit exceeded")
+                        break
+                    if rate_limiter.should_notify():
+                        scope, retry_after = throttled
+                        notice = {"throttle": {"scope": scope, "retryAfterMs": int(retry_after * 1000)}}
+                        await client_websocket.send_text(json.dumps(notice))
+                    continue
                 
                 # Log User message
                 logger.log_message(session_id, client_id, "User", message)
 
-                # Check if this is a setup message
+                # Parse once; frames can be large base64 media chunks
                 try:
                     data = json.loads(message)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    data = {}
+
+                # Check if this is a setup message
+                try:
                     if "setup" in data:
                         # --- Enforce Backend Model ID ---
                         if "model" in data["setup"]:
@@ -114,12 +189,37 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
                                 print(f"{log_prefix} 🔧 Enforcing Model ID: {GEMINI_MODEL_ID}")
                         # --------------------------------
 
+                        # --- Declare Server-side Tools ---
+                        declarations = server_tool_declarations()
+                        tools = data["setup"].get("tools")
+                        if declarations and isinstance(tools, dict):
+                            key = "functionDeclarations" if "functionDeclarations" in tools else "function_declarations"
+                            # Grounding-only setups have no function declarations; leave them alone
+                            if key in tools:
+                                tools[key] = tools[key] + declarations
+                                message = json.dumps(data)
+                        # ---------------------------------
+
+                        # Text rooms keep the first setup to replay whenever the upstream (re)opens
+                        if session.mode == ROOM_MODE_TEXT:
+                            if not session.setup_message:
+                                # Ask for resumption handles so a suspended conversation can be picked up again
+                                setup = data["setup"]
+                                if "sessionResumption" not in setup and "session_resumption" not in setup:
+                                    setup["session_resumption"] = {}
+                                session.setup_message = json.dumps(data)
+                            await client_websocket.send_text(json.dumps({"setupComplete": {}}))
+                            await send_catchup(session, client_websocket)
+                            continue
+
                         # If session already has a gemini connection active and we are not the first user...
                         if getattr(session, 'setup_complete', False):
                             print(f"{log_prefix} Skipping duplicate setup message")
                             # Send a fake 'setupComplete' to this client so it knows it's ready
                             response = {"setupComplete": {}}
                             await client_websocket.send_text(json.dumps(response))
+                            # Bring the late joiner up to speed in one batch
+                            await send_catchup(session, client_websocket)
                             continue
                         else:
                             # Mark setup as complete (or in progress)
@@ -128,28 +228,53 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
                     pass
 
                 # Handle Ping/Pong
-                try:
-                    data = json.loads(message)
-                    if data.get("ping"):
-                        await client_websocket.send_text(json.dumps({"pong": True}))
-                        continue
-                except:
-                    pass
+                if data.get("ping"):
+                    await client_websocket.send_text(json.dumps({"pong": True}))
+                    continue
 
-                # 1. Forward to Gemini
-                if session.gemini_ws:
-                    await session.gemini_ws.send(message)
+                # Only one participant's answer per tool call goes upstream
+                if ("toolResponse" in data or "tool_response" in data) and not session.tool_dispatcher.accept_response(client_id, data):
+                    print(f"{log_prefix} Dropping duplicate tool response")
+                    continue
+
+                # Drop or decimate video (never audio) when the upstream falls behind
+                if is_video_frame(data) and not governor.admit_video(client_id):
+                    continue
+
+                # Reopen a text room's upstream that hasn't started yet or was suspended
+                if session.mode == ROOM_MODE_TEXT and not session.gemini_ws:
+                    try:
+                        await resume_upstream(session)
+                    except Exception as e:
+                        print(f"{log_prefix} ❌ Failed to resume upstream: {e}")
+                        await client_websocket.send_text(json.dumps({"error": {"message": str(e)}}))
+
+                # 1. Forward to Gemini (microphone audio goes through the room's mixer when enabled)
+                if session.audio_mixer and session.audio_mixer.accept(client_id, data):
+                    pass
+                elif session.gemini_ws:
+                    session.touch()
+                    governor.begin_send()
+                    started = time.perf_counter()
+                    try:
+                        await session.gemini_ws.send(message)
+                    finally:
+                        fps_changed = governor.end_send(time.perf_counter() - started)
+                    if fps_changed:
+                        print(f"[Session: {session_id}] 🎞️ Video target now {governor.target_fps:.2f} fps")
+                        await broadcast_to_users(session, json.dumps(governor.control_message()))
                     
                     # --- Text Extraction for Logs ---
                     try:
-                        data = json.loads(message)
-                        client_content = data.get("clientContent", {})
+                        # The web client sends snake_case (client_content)
+                        client_content = data.get("clientContent") or data.get("client_content") or {}
                         turns = client_content.get("turns", [])
                         for turn in turns:
                             for part in turn.get("parts", []):
                                 text = part.get("text")
                                 if text:
                                     logger.log_message(session_id, client_id, "UserText (Direct)", text)
+                                    session.catchup.record_client_text(text)
                     except:
                         pass
                 else:
@@ -183,6 +308,9 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
             session.users.remove(client_websocket)
             if client_websocket in session.user_ids:
                 del session.user_ids[client_websocket]
+            session.media_governor.forget(client_id)
+            if session.audio_mixer:
+                session.audio_mixer.forget(client_id)
             print(f"[Session: {session.session_id}] [Client: {client_id}] User left. Remaining users: {len(session.users)}")
             
             # Flush logs for THIS session 
@@ -202,6 +330,11 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
                         print(f"Session {sid} cleanup initiated after grace period.")
                         if s.gemini_task:
                             s.gemini_task.cancel()
+                        if s.idle_task:
+                            s.idle_task.cancel()
+                        if s.audio_mixer:
+                            s.audio_mixer.stop()
+                        s.tool_dispatcher.cancel()
                         if s.gemini_ws:
                             try:
                                 await s.gemini_ws.close()
@@ -209,6 +342,7 @@ async def handle_websocket_client(client_websocket: WebSocket) -> None:
                                 pass
                         if sid in sessions:
                             del sessions[sid]
+                        room_manager.mark_active(sid, s.created_at)
                         print(f"Session {sid} cleaned up.")
                     else:
                         print(f"Session {sid} cleanup aborted - user returned during grace period.")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+CPU cost of the server-side audio mixer (app/audio_mixer.py).
+
+For each participant count, feeds every participant one 100 ms chunk of
+16 kHz PCM per packet and times decode + jitter buffering + mixing + encoding.
+Reports the time per packet, per participant, and the share of one core
+needed to keep up in real time.
+
+Usage: python bench_audio_mixer.py [--packets 500] [--participants 1 2 4 8 16]
+"""
+
+import argparse
+import base64
+import time
+import numpy as np
+from app.audio_mixer import AudioMixer, FRAME_SAMPLES, FRAMES_PER_PACKET, PACKET_SECONDS
+
+class FakeSession:
+    session_id = "bench"
+    gemini_ws = None
+
+def make_chunk(rng):
+    pcm = (rng.standard_normal(FRAME_SAMPLES * FRAMES_PER_PACKET) * 3000).astype("<i2")
+    data = base64.b64encode(pcm.tobytes()).decode("ascii")
+    return {"realtime_input": {"media_chunks": [{"mime_type": "audio/pcm", "data": data}]}}
+
+def bench(participants, packets):
+    rng = np.random.default_rng(0)
+    chunk = make_chunk(rng)
+    mixer = AudioMixer(FakeSession())
+    # Don't start the pacing task; the benchmark drives mix_packet directly
+    mixer.task = object()
+
+    started = time.perf_counter()
+    for _ in range(packets):
+        for p in range(participants):
+            mixer.accept(f"client-{p}", chunk)
+        pcm = mixer.mix_packet()
+        if pcm is not None:
+            mixer.encode_packet(pcm)
+    elapsed = time.perf_counter() - started
+    return elapsed / packets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=500)
+    parser.add_argument("--participants", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'users':>5}  {'µs/packet':>10}  {'µs/user':>8}  {'core %':>7}")
+    for participants in args.participants:
+        per_packet = bench(participants, args.packets)
+        print(f"{participants:>5}  {per_packet * 1e6:>10.1f}  {per_packet * 1e6 / participants:>8.1f}  "
+              f"{per_packet / PACKET_SECONDS * 100:>6.2f}%")
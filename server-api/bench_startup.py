@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the proxy server.
+
+Reports:
+  • import time of `server` (median of several fresh interpreters)
+  • time from process launch until the first HTTP response on /
+  • latency of the first and second GET /rooms (first touches GCS)
+
+Usage: python bench_startup.py [--runs 5] [--port 8181]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import urllib.error
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import server; "
+    "print(time.perf_counter() - t)"
+)
+
+def measure_import(runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=HERE, capture_output=True, text=True, check=True
+        )
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+def timed_get(url, timeout=30):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            status = response.status
+            response.read()
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+def measure_first_request(port, timeout=30):
+    env = dict(os.environ, PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "server.py"], cwd=HERE, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        ready = None
+        while time.perf_counter() - started < timeout:
+            try:
+                timed_get(f"{base}/", timeout=1)
+                ready = time.perf_counter() - started
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        if ready is None:
+            raise RuntimeError("Server did not start in time")
+
+        first = timed_get(f"{base}/rooms")
+        second = timed_get(f"{base}/rooms")
+        return ready, first, second
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8181)
+    args = parser.parse_args()
+
+    imports = measure_import(args.runs)
+    print(f"import server:        median {statistics.median(imports) * 1000:7.1f} ms "
+          f"(min {min(imports) * 1000:.1f}, max {max(imports) * 1000:.1f})")
+
+    ready, (status1, first), (status2, second) = measure_first_request(args.port)
+    print(f"launch → first GET /: {ready * 1000:7.1f} ms")
+    print(f"first GET /rooms:     {first * 1000:7.1f} ms (HTTP {status1})")
+    print(f"second GET /rooms:    {second * 1000:7.1f} ms (HTTP {status2})")
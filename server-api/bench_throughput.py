@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Proxy throughput under different server settings (app/serve.py).
+
+Starts mock_gemini.py as the upstream, then for each configuration launches
+`python server.py --production` and has N clients (each in its own room)
+stream audio-sized realtime_input frames through it for a fixed time.
+Reports frames/s and MB/s of echoed upstream responses received by the
+clients, plus p50/p99 round-trip latency.
+
+Usage: python bench_throughput.py [--clients 50] [--seconds 10] [--frame-bytes 3200]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import websockets
+
+MOCK_URL = "ws://localhost:9090"
+PORT = 8099
+
+CONFIGS = [
+    ("asyncio + h11", {"SERVER_LOOP": "asyncio", "SERVER_HTTP": "h11", "WS_PER_MESSAGE_DEFLATE": "false"}),
+    ("uvloop + httptools", {"SERVER_LOOP": "uvloop", "SERVER_HTTP": "httptools", "WS_PER_MESSAGE_DEFLATE": "false"}),
+    ("uvloop + httptools + deflate", {"SERVER_LOOP": "uvloop", "SERVER_HTTP": "httptools", "WS_PER_MESSAGE_DEFLATE": "true"}),
+    # Every bench client has a room of its own, which is the only case where unrouted
+    # workers are correct; shared rooms would be split across processes
+    ("uvloop + httptools, 2 workers", {"SERVER_LOOP": "uvloop", "SERVER_HTTP": "httptools",
+                                       "WS_PER_MESSAGE_DEFLATE": "false", "WORKERS": "2",
+                                       "ALLOW_UNROUTED_WORKERS": "true"}),
+]
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("localhost", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+async def client(index, frame, seconds, results, compression):
+    async with websockets.connect(f"ws://localhost:{PORT}/ws", max_size=None, compression=compression,
+                                  ping_interval=None, open_timeout=None) as ws:
+        await ws.send(json.dumps({"bearer_token": "dummy", "service_url": MOCK_URL, "session_id": f"bench-{index}"}))
+        received = 0
+        received_bytes = 0
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        # One frame in flight per client: send, wait for the upstream echo
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await ws.send(frame)
+            reply = await ws.recv()
+            latencies.append(time.perf_counter() - started)
+            received += 1
+            received_bytes += len(reply)
+        results.append((received, received_bytes, latencies))
+
+async def run_clients(clients, seconds, frame_bytes, compression):
+    pcm = os.urandom(frame_bytes)
+    frame = json.dumps({"realtime_input": {"media_chunks": [{"mime_type": "audio/pcm", "data": base64.b64encode(pcm).decode()}]}})
+    results = []
+    await asyncio.gather(*(client(i, frame, seconds, results, compression) for i in range(clients)))
+    frames = sum(r[0] for r in results)
+    received_bytes = sum(r[1] for r in results)
+    latencies = sorted(l for r in results for l in r[2])
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    median = statistics.median(latencies) if latencies else 0
+    return frames / seconds, received_bytes / seconds / 1e6, median * 1000, p99 * 1000
+
+def start_server(env_overrides):
+    env = dict(os.environ, PORT=str(PORT), SEARCH_INDEX_DIR=tempfile.mkdtemp(),
+               CLIENT_MSGS_PER_SECOND="100000", CLIENT_BYTES_PER_SECOND=str(1 << 30),
+               ROOM_MSGS_PER_SECOND="100000", ROOM_BYTES_PER_SECOND=str(1 << 30),
+               ROOM_IDLE_TTL_SECONDS="0", **env_overrides)
+    return subprocess.Popen([sys.executable, "server.py", "--production"], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+async def main(args):
+    mock = subprocess.Popen([sys.executable, "mock_gemini.py"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_port(9090)
+        print(f"{args.clients} clients, {args.seconds}s, {args.frame_bytes}-byte PCM frames\n")
+        print(f"{'config':<32} {'frames/s':>9} {'MB/s':>7} {'p50 ms':>7} {'p99 ms':>7}")
+        for name, env in CONFIGS:
+            server = start_server(env)
+            try:
+                await wait_for_port(PORT)
+                # Warm up: first joins pay for credential lookups and GCS client setup
+                await run_clients(args.clients, 1, args.frame_bytes, None)
+                compression = "deflate" if env.get("WS_PER_MESSAGE_DEFLATE") == "true" else None
+                rate, mbps, p50, p99 = await run_clients(args.clients, args.seconds, args.frame_bytes, compression)
+                print(f"{name:<32} {rate:>9.0f} {mbps:>7.2f} {p50:>7.1f} {p99:>7.1f}")
+            finally:
+                stop(server)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--frame-bytes", type=int, default=3200, help="PCM bytes per frame (3200 = 100 ms at 16 kHz)")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -8,16 +8,24 @@ handling Google Cloud authentication automatically using default credentials.
 Uses FastAPI for HTTP and Websocket handling.
 """
 
+import asyncio
 import uvicorn
 import os
+import sys
 from fastapi import FastAPI, WebSocket, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import WS_PORT, GCS_BUCKET_NAME
+from app.config import WS_PORT, GCS_BUCKET_NAME, ROOM_MODE_LIVE, ROOM_BATCH_MAX, ROOM_IDLE_TTL_SECONDS, ROOM_HEARTBEAT_SECONDS
 from app.websocket import handle_websocket_client
 from app.room_manager import room_manager
-from pydantic import BaseModel
+from app.search_index import search_index
+from app.startup import lifespan
+from app.serve import run_production
+from app.metrics import collect_metrics
+from app.session import sessions
+from typing import List
+from pydantic import BaseModel, Field
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS
 app.add_middleware(
@@ -30,10 +38,27 @@ app.add_middleware(
 
 class CreateRoomRequest(BaseModel):
     name: str = None
+    mode: str = ROOM_MODE_LIVE
+    audio_mixing: bool = None
 
 class CreateRoomResponse(BaseModel):
     room_id: str
     name: str
+    mode: str = ROOM_MODE_LIVE
+
+class BatchCreateRoomsRequest(BaseModel):
+    rooms: List[CreateRoomRequest]
+
+class RoomIdsRequest(BaseModel):
+    room_ids: List[str]
+
+class SweepRoomsRequest(BaseModel):
+    # Live rooms on other instances only refresh last_active_at every ROOM_HEARTBEAT_SECONDS
+    idle_seconds: float = Field(ROOM_IDLE_TTL_SECONDS, gt=2 * ROOM_HEARTBEAT_SECONDS)
+
+def check_batch_size(items):
+    if len(items) > ROOM_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ROOM_BATCH_MAX} rooms per request")
 
 @app.get("/")
 async def root():
@@ -41,20 +66,25 @@ async def root():
 
 @app.post("/room", response_model=CreateRoomResponse)
 async def create_room(request: CreateRoomRequest = None):
-    """Create a new room with an optional name."""
+    """Create a new room with an optional name and type ("live" or "text")."""
     name = request.name if request else None
-    room_meta = room_manager.create_room(name=name)
+    mode = request.mode if request else ROOM_MODE_LIVE
+    audio_mixing = request.audio_mixing if request else None
+    try:
+        room_meta = await asyncio.to_thread(room_manager.create_room, name=name, mode=mode, audio_mixing=audio_mixing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return room_meta
 
 @app.get("/rooms")
 async def list_rooms():
     """List all open rooms."""
-    return room_manager.list_rooms()
+    return await asyncio.to_thread(room_manager.list_rooms)
 
 @app.get("/room/{room_id}")
 async def get_room(room_id: str):
     """Get room details."""
-    room = room_manager.get_room(room_id)
+    room = await asyncio.to_thread(room_manager.get_room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
@@ -62,11 +92,56 @@ async def get_room(room_id: str):
 @app.post("/room/{room_id}/close")
 async def close_room(room_id: str):
     """Close a room."""
-    success = room_manager.close_room(room_id)
+    success = await asyncio.to_thread(room_manager.close_room, room_id)
     if not success:
         raise HTTPException(status_code=404, detail="Room not found")
     return {"message": "Room closed"}
 
+@app.post("/rooms/batch/create")
+async def create_rooms(request: BatchCreateRoomsRequest):
+    """Create many rooms at once."""
+    check_batch_size(request.rooms)
+    specs = [dict(room) for room in request.rooms]
+    try:
+        rooms = await asyncio.to_thread(room_manager.create_rooms, specs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"rooms": rooms}
+
+@app.post("/rooms/batch/get")
+async def get_rooms(request: RoomIdsRequest):
+    """Get details for many rooms at once."""
+    check_batch_size(request.room_ids)
+    rooms, not_found = await asyncio.to_thread(room_manager.get_rooms, request.room_ids)
+    return {"rooms": rooms, "not_found": not_found}
+
+@app.post("/rooms/batch/close")
+async def close_rooms(request: RoomIdsRequest):
+    """Close many rooms at once."""
+    check_batch_size(request.room_ids)
+    closed, not_found = await asyncio.to_thread(room_manager.close_rooms, request.room_ids)
+    return {"closed": closed, "not_found": not_found}
+
+@app.post("/rooms/sweep")
+async def sweep_rooms(request: SweepRoomsRequest = None):
+    """Close open rooms with no activity for idle_seconds (defaults to ROOM_IDLE_TTL_SECONDS)."""
+    idle_seconds = request.idle_seconds if request else ROOM_IDLE_TTL_SECONDS
+    closed = await asyncio.to_thread(room_manager.close_stale_rooms, idle_seconds, set(sessions))
+    return {"closed": closed}
+
+@app.get("/search")
+async def search(q: str, limit: int = 20):
+    """Full-text search over room transcripts. Returns room_id, timestamp and snippet per hit."""
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    results = await asyncio.to_thread(search_index.search, q, limit)
+    return {"query": q, "results": results}
+
+@app.get("/metrics")
+async def metrics():
+    """Per-session runtime stats (users, upstream state, video fps and dropped frames)."""
+    return collect_metrics()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await handle_websocket_client(websocket)
@@ -92,4 +167,7 @@ if __name__ == "__main__":
 ║                                                                ║
 ╚════════════════════════════════════════════════════════════════╝ 
 """)
-    uvicorn.run(app, host="0.0.0.0", port=WS_PORT)
\ No newline at end of file
+    if "--production" in sys.argv:
+        run_production(app)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=WS_PORT)
@@ -160,6 +160,7 @@ export class GeminiLiveAPI {
     this.retryCount = 0;
     this.reconnectTimeout = null;
     this.intentionalDisconnect = false;
+    this.targetFps = null; // Set by the proxy's mediaControl messages
 
     // Default callbacks
     this.onReceiveResponse = (message) => {
@@ -276,10 +277,48 @@ export class GeminiLiveAPI {
   onReceiveMessage(messageEvent) {
     // console.log("Message received: ", messageEvent);
     const messageData = JSON.parse(messageEvent.data);
+    // Proxy-side media governor asks for a lower video frame rate
+    if (messageData?.mediaControl) {
+      this.targetFps = messageData.mediaControl.targetFps;
+      console.log("🎞️ Proxy requested video target fps:", this.targetFps);
+      return;
+    }
+    // Proxy rate limiter dropped some of our frames
+    if (messageData?.throttle) {
+      console.warn("⏳ Proxy throttled messages:", messageData.throttle);
+      return;
+    }
+    // Late joiners get the room's recent output as one batch; replay it
+    // through the normal handlers as if it had arrived live
+    if (messageData?.catchUp) {
+      this.replayCatchUp(messageData.catchUp);
+      return;
+    }
     const message = new MultimodalLiveResponseMessage(messageData);
     this.onReceiveResponse(message);
   }
 
+  replayCatchUp(catchUp) {
+    for (const entry of catchUp.transcript || []) {
+      const key =
+        entry.role === "user" ? "inputTranscription" : "outputTranscription";
+      const transcription = { text: entry.text, finished: true };
+      this.onReceiveResponse(
+        new MultimodalLiveResponseMessage({
+          serverContent: { [key]: transcription },
+        })
+      );
+    }
+    if (catchUp.audio) {
+      const part = { inlineData: catchUp.audio };
+      this.onReceiveResponse(
+        new MultimodalLiveResponseMessage({
+          serverContent: { modelTurn: { parts: [part] } },
+        })
+      );
+    }
+  }
+
   setupWebSocketToService() {
     console.log("connecting: ", this.proxyUrl);
 
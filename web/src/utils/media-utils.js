@@ -185,9 +185,18 @@ class BaseVideoCapture {
    * Start capturing and sending frames
    */
   startCapturing() {
+    let lastFrameAt = 0;
     const captureFrame = () => {
       if (!this.isStreaming) return;
 
+      // Honour the proxy's target fps when it's lower than ours
+      const targetFps = this.client?.targetFps;
+      if (targetFps && targetFps < this.fps) {
+        const now = performance.now();
+        if (now - lastFrameAt < 900 / targetFps) return;
+        lastFrameAt = now;
+      }
+
       // Draw current frame to canvas
       this.ctx.drawImage(
         this.video,